@@ -0,0 +1,175 @@
+"""Module with a stateless API to the analyses, safe to call from threads.
+
+The classes of 'baseclasses' keep their work on the instance: 'decompose'
+and 'compose' rewrite a Chord's notes and names, and the scales live in
+dicts of the Scale class. Sharing them between threads is unsafe. The
+functions here take plain values and return tuples, and share nothing but
+read-only tables: the chord index of 'chordindex', the template tensor of
+'keyscore' and the profiles of its weighted mode. These are built once,
+under a lock, into a 'Tables' snapshot whose arrays can't be written, and
+built again, into a new snapshot, when the scales stored in the Scale class
+change. A call reads the snapshot once, so it never sees half of one.
+
+The functions can so be called from any number of threads at once, as from
+a 'concurrent.futures.ThreadPoolExecutor', on regular builds of Python and
+on the free-threaded builds of 3.13 and later, where they run in parallel.
+The caches they go through, those of 'functools', are safe there too. What
+must not run at the same time as them is anything that changes the shared
+state: declaring scales, or 'chordparser.set_cache_size'.
+
+'benchmark --threads N' checks their answers from 1 to N threads against
+those of a single thread, and reports the throughput of each.
+
+Imports:
+    collections, threading: hold the tables and build them once.
+    numpy: ranks the keys.
+    base: contains the chromatic scale and pitch-class functions.
+    baseclasses: contains the Scale class whose version is followed.
+    chordindex: builds the chord index.
+    chordparser: returns the notes and masks of chord names.
+    keyscore: builds the templates and profiles, and weighs the chords.
+    scalemaker: declares the default scales.
+
+Classes:
+    Tables: Read-only snapshot of the tables the functions use.
+
+Functions:
+    tables(): returns the snapshot, building it if the scales changed.
+    decompose(): returns the notes of a chord name.
+    identify(): names a chord from its notes, and each of its inversions.
+    rank_keys(): returns the most probable keys of chord names.
+"""
+import collections
+import threading
+
+import numpy as np
+
+import base
+import baseclasses
+import chordindex
+import chordparser
+import keyscore
+import scalemaker
+
+_lock = threading.Lock()
+_tables = None
+
+
+class Tables(collections.namedtuple(
+        "Tables", "version chords scales tensor lengths keys profiles")):
+    """Read-only snapshot of the tables the functions use.
+
+    Attributes:
+        version: Version of the Scale class the snapshot was built on.
+        chords: Name suffix of each interval mask, as in 'chordindex'.
+        scales: Names of the scales, in the order of the tensor.
+        tensor: (scales, 12, 12) templates of 'keyscore.templates'.
+        lengths: Number of notes of each scale.
+        keys: Tonic and scale of each of the 24 profiles.
+        profiles: (24, 12) standardized profiles of 'keyscore.profiles'.
+    """
+
+    __slots__ = ()
+
+
+def _frozen(array):
+    """Returns a copy of an array that can't be written."""
+    array = np.array(array)
+    array.flags.writeable = False
+    return array
+
+
+def tables():
+    """Returns the snapshot of the tables, building it if the scales changed.
+
+    The first call, and the first after the scales change, takes the lock
+    and builds a new snapshot; the others only read the current one.
+    """
+    global _tables
+    current = _tables
+    if current is None or current.version != baseclasses.Scale.version:
+        with _lock:
+            scalemaker.register()
+            current = _tables
+            if (current is None
+                    or current.version != baseclasses.Scale.version):
+                names, tensor, lengths = keyscore.templates()
+                keys, profiles = keyscore.profiles()
+                current = Tables(baseclasses.Scale.version,
+                                 tuple(chordindex.table()), names,
+                                 _frozen(tensor), _frozen(lengths), keys,
+                                 _frozen(profiles))
+                _tables = current
+    return current
+
+
+def decompose(name):
+    """Returns the notes of a chord name, the root first.
+
+    Raises:
+        ValueError: if the name can't be read.
+    """
+    return tuple(chordparser.chord_notes(name))
+
+
+def identify(notes):
+    """Names a chord from its notes, with each of them as the root.
+
+    Args:
+        notes (iterable): note names, the root first.
+
+    Returns:
+        tuple: the names, in the order of the notes, as 'chordindex.identify'
+            gives them.
+
+    Raises:
+        ValueError: if a note can't be read.
+    """
+    notes = tuple(notes)
+    chords = tables().chords
+    mask = base.notes_mask(notes)
+    names = []
+    for note in notes:
+        root = base.pitch_class(note)
+        names.append(note + chords[base.rotate(mask | 1 << root, -root)])
+    return tuple(names)
+
+
+def rank_keys(chords, top=3, weighted=False):
+    """Returns the most probable keys of chord names.
+
+    Args:
+        chords (iterable): chord names, each followed by ":duration" if
+            weighted. i.e: ["C:2", "G7:1", "C"]
+        top (int): number of keys returned.
+        weighted (bool): if true, ranks the 24 major and minor keys as
+            'keyscore.rank_weighted' does, else every scale as
+            'keyscore.rank_chords' does.
+
+    Returns:
+        tuple: (tonic, scale, percentage or confidence) tuples, the most
+            probable first.
+
+    Raises:
+        ValueError: if a chord name or a duration can't be read.
+    """
+    snapshot = tables()
+    if weighted:
+        # Standardized as 'keyscore.correlate' does, for the same output.
+        histogram = keyscore.standardize(
+            keyscore.histogram(list(chords))[None])
+        row = keyscore.confidences(histogram @ snapshot.profiles.T)[0]
+        order = np.argsort(-row, kind="stable")[:top]
+        return tuple(snapshot.keys[index] + (round(float(row[index]), 4),)
+                     for index in order)
+
+    mask = 0
+    for name in chords:
+        mask |= chordparser.chord_mask(name)
+    vector = keyscore.mask_vector(mask)
+    row = ((snapshot.tensor @ vector) / snapshot.lengths[:, None]).ravel()
+    order = np.argsort(-row, kind="stable")[:top]
+    percentages = np.clip(np.rint(row[order] * 100), 0, 100)
+    return tuple((base.notes[index % 12], snapshot.scales[index // 12],
+                  int(percentage))
+                 for index, percentage in zip(order, percentages))
@@ -0,0 +1,404 @@
+"""Module to find the keys and chords of recordings in PCM WAV files.
+
+The file is mapped into memory with 'mmap' and its samples are viewed in
+place as a NumPy array, so only the frames being analysed are ever read
+into memory: the recording is cut into frames of 'FRAME' samples, every
+'HOP' samples, and each batch of frames is mixed down to mono, windowed and
+turned into spectra by one FFT. The energy of each frequency bin between
+'LOW' and 'HIGH' Hz is added to the pitch class nearest to it, which gives
+a 12-bin chromagram per frame, and that of the bins below 'BASS' Hz to a
+second one, whose loudest pitch class is the bass.
+
+The chromagram is added up over the whole recording, or over windows of a
+number of seconds, into the histograms 'keyscore' ranks the 24 major and
+minor keys with, and each window may be named by 'chordindex.label'.
+Memory stays bounded by the size of a batch, however long the recording.
+
+Integer samples of 8, 16, 24 and 32 bits and floating samples of 32 and
+64 bits are read, with any number of channels.
+
+Run as a script over files or folders, writing one JSON line per file:
+    python audio.py [--window SECONDS] [--top N] [--chords]
+                    [--workers N] PATH ...
+
+Imports:
+    argparse, json, mmap, sys: handle the command line, the mapping of the
+        files and the output.
+    numpy: computes the spectra and the chromagrams.
+    base: contains the pitch-class functions.
+    chordindex: names chords from their pitch classes.
+    keyscore: ranks the keys of the chromagrams.
+    parallel: analyses many files, across processes if asked.
+    transpose: spells the chords in the key of the recording.
+
+Vars:
+    FRAME, HOP (int): samples per frame, and between frames.
+    BATCH (int): frames transformed at a time.
+    LOW, HIGH, BASS (float): frequencies in Hz bounding the chroma bins and
+        the bass bins.
+    BASS_SHARE (float): least share of the loudest pitch class the loudest
+        bass must have to count as the bass.
+    EXTENSIONS (tuple): endings of the WAV files found in folders.
+
+Classes:
+    WaveFile: PCM WAV file mapped into memory.
+
+Functions:
+    chroma_bins(): maps FFT bins to pitch classes.
+    chromagram(): yields the chromagram of a recording, a batch at a time.
+    windows(): adds a chromagram up into one histogram per window.
+    analyse(): returns the keys, and chords, of a WAV file.
+    analyse_many(): analyses many WAV files, across processes if asked.
+    main(): analyses WAV files from the command line.
+"""
+import argparse
+import json
+import mmap
+import sys
+
+import numpy as np
+
+import base
+import chordindex
+import keyscore
+import parallel
+import transpose
+
+FRAME = 8192
+HOP = 4096
+BATCH = 64
+LOW = 55.0
+HIGH = 4200.0
+BASS = 160.0
+BASS_SHARE = 0.1
+EXTENSIONS = (".wav", ".wave")
+
+_formats = {1: "int", 3: "float"}
+
+
+class WaveFile:
+    """PCM WAV file mapped into memory, its samples viewed in place.
+
+    Used as a context, which unmaps the file when it ends.
+
+    Attributes:
+        path (str): Path of the file.
+        rate (int): Frames per second.
+        channels (int): Number of channels.
+        width (int): Bytes per sample.
+        frames (int): Number of frames, one sample per channel each.
+
+    Methods:
+        mono: Returns frames mixed down to mono, as floats from -1 to 1.
+        close: Unmaps the file.
+    """
+
+    def __init__(self, path):
+        """Maps a file and finds its format and its samples.
+
+        Raises:
+            ValueError: if the file isn't a PCM WAV file.
+        """
+        self.path = path
+        with open(path, "rb") as file:
+            try:
+                self._map = mmap.mmap(file.fileno(), 0,
+                                      access=mmap.ACCESS_READ)
+            except ValueError:
+                raise ValueError("{} is empty".format(path)) from None
+        if hasattr(self._map, "madvise"):
+            # Frames are read once, in order.
+            self._map.madvise(mmap.MADV_SEQUENTIAL)
+        try:
+            self._read_chunks()
+        except (ValueError, IndexError, KeyError) as error:
+            self._map.close()
+            raise ValueError("{} is not a PCM WAV file: {}".format(
+                path, error)) from None
+
+    def _read_chunks(self):
+        """Reads the format chunk and views the data chunk as samples."""
+        data = self._map
+        if data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+            raise ValueError("no RIFF header")
+        index = 12
+        kind = None
+        while index + 8 <= len(data):
+            name = data[index:index + 4]
+            length = int.from_bytes(data[index + 4:index + 8], "little")
+            start = index + 8
+            if name == b"fmt ":
+                tag = int.from_bytes(data[start:start + 2], "little")
+                self.channels = int.from_bytes(data[start + 2:start + 4],
+                                               "little")
+                self.rate = int.from_bytes(data[start + 4:start + 8],
+                                           "little")
+                self.width = int.from_bytes(data[start + 14:start + 16],
+                                            "little") // 8
+                if tag == 0xFFFE:
+                    # The extensible format keeps the tag in its subformat.
+                    tag = int.from_bytes(data[start + 24:start + 26],
+                                         "little")
+                kind = _formats[tag]
+                if self.channels < 1 or self.width < 1 or self.rate < 1:
+                    raise ValueError("{} channels of {}-bit samples at {} "
+                                     "Hz".format(self.channels,
+                                                 self.width * 8, self.rate))
+            elif name == b"data":
+                if kind is None:
+                    raise ValueError("data before format")
+                size = min(length, len(data) - start)
+                self.frames = size // (self.width * self.channels)
+                self._start = start
+                break
+            # Chunks are padded to an even length.
+            index = start + length + length % 2
+        else:
+            raise ValueError("no data")
+
+        if kind == "float" and self.width in (4, 8):
+            dtype = np.dtype("<f{}".format(self.width))
+        elif kind == "int" and self.width in (1, 2, 4):
+            dtype = np.dtype("u1" if self.width == 1
+                             else "<i{}".format(self.width))
+        elif kind == "int" and self.width == 3:
+            dtype = np.dtype("u1")
+        else:
+            raise ValueError("{}-bit {} samples".format(self.width * 8, kind))
+        columns = self.channels * (3 if self.width == 3 else 1)
+        self._samples = np.frombuffer(data, dtype, self.frames * columns,
+                                      self._start).reshape(self.frames,
+                                                           columns)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def close(self):
+        """Drops the view of the samples and unmaps the file."""
+        self._samples = None
+        self._map.close()
+
+    def mono(self, start, stop):
+        """Returns frames mixed down to mono, as floats from -1 to 1.
+
+        Only the frames asked for are read from the file.
+
+        Args:
+            start, stop (int): first frame and the one after the last.
+        """
+        block = self._samples[start:stop]
+        if self.width == 3:
+            # Three little-endian bytes per sample, sign-extended.
+            block = block.reshape(len(block), self.channels, 3).astype(
+                np.int32)
+            block = (block[..., 0] | block[..., 1] << 8
+                     | block[..., 2] << 16)
+            block = np.where(block & 0x800000, block - 0x1000000, block)
+            scale = 2.0 ** 23
+        elif self.width == 1:
+            block = block.astype(np.float64) - 128
+            scale = 128.0
+        elif self._samples.dtype.kind == "f":
+            scale = 1.0
+        else:
+            scale = 2.0 ** (self.width * 8 - 1)
+        return block.mean(axis=1, dtype=np.float64) / scale
+
+
+def chroma_bins(rate, frame=FRAME, low=LOW, high=HIGH, bass=BASS):
+    """Maps the bins of an FFT to pitch classes.
+
+    Args:
+        rate (int): frames per second of the recording.
+        frame (int): samples per FFT.
+        low, high (float): frequencies in Hz of the bins kept.
+        bass (float): frequency in Hz below which bins count for the bass.
+
+    Returns:
+        ndarray: (bins, 12) matrix adding the energy of each bin kept to
+            its nearest pitch class.
+        ndarray: the same for the bass bins.
+    """
+    frequencies = np.fft.rfftfreq(frame, 1 / rate)
+    kept = (frequencies >= low) & (frequencies <= min(high, rate / 2))
+    # MIDI note numbers of the bins, 69 being A at 440 Hz.
+    notes = 69 + 12 * np.log2(np.maximum(frequencies, 1e-9) / 440)
+    classes = np.rint(notes).astype(int) % 12
+    mapping = np.zeros((len(frequencies), 12))
+    mapping[kept, classes[kept]] = 1
+    bass_mapping = mapping * (frequencies < bass)[:, None]
+    return mapping, bass_mapping
+
+
+def chromagram(wave, frame=FRAME, hop=HOP, batch=BATCH):
+    """Yields the chromagram of a recording, a batch of frames at a time.
+
+    Each frame is weighted by a Hann window before its FFT, and the
+    magnitude of each bin is added to its pitch class.
+
+    Args:
+        wave (WaveFile): the recording.
+        frame, hop (int): samples per frame, and between frames.
+        batch (int): frames transformed at a time.
+
+    Yields:
+        tuple: (frames, 12) chromagram and bass chromagram of each batch.
+    """
+    mapping, bass_mapping = chroma_bins(wave.rate, frame)
+    window = np.hanning(frame)
+    count = max(0, (wave.frames - frame) // hop + 1)
+    if not count and wave.frames:
+        # Recordings shorter than a frame are padded into one.
+        count = 1
+    for first in range(0, count, batch):
+        frames = min(batch, count - first)
+        start = first * hop
+        samples = wave.mono(start, start + (frames - 1) * hop + frame)
+        if len(samples) < (frames - 1) * hop + frame:
+            samples = np.pad(samples, (0, (frames - 1) * hop + frame
+                                       - len(samples)))
+        blocks = np.lib.stride_tricks.sliding_window_view(
+            samples, frame)[::hop]
+        spectra = np.abs(np.fft.rfft(blocks * window, axis=1))
+        yield spectra @ mapping, spectra @ bass_mapping
+
+
+def windows(wave, seconds=None, frame=FRAME, hop=HOP, batch=BATCH):
+    """Adds the chromagram of a recording up into one histogram per window.
+
+    Each frame counts in the window its middle falls in.
+
+    Args:
+        wave (WaveFile): the recording.
+        seconds (float): length of each window, one window for the whole
+            recording if None.
+
+    Returns:
+        histograms (ndarray): (windows, 12) chroma energy of each window.
+        basses (ndarray): (windows, 12) bass energy of each window.
+    """
+    length = max(round(seconds * wave.rate), 1) if seconds else None
+    histograms = np.zeros((0, 12))
+    basses = np.zeros((0, 12))
+    first = 0
+    for chroma, bass in chromagram(wave, frame, hop, batch):
+        middles = (first + np.arange(len(chroma))) * hop + frame // 2
+        numbers = middles // length if length else np.zeros(len(chroma),
+                                                            dtype=int)
+        count = int(numbers[-1]) + 1
+        if count > len(histograms):
+            histograms = np.vstack([histograms,
+                                    np.zeros((count - len(histograms), 12))])
+            basses = np.vstack([basses,
+                                np.zeros((count - len(basses), 12))])
+        np.add.at(histograms, numbers, chroma)
+        np.add.at(basses, numbers, bass)
+        first += len(chroma)
+    return histograms, basses
+
+
+def _keys(found):
+    """Turns the (tonic, scale, confidence) tuples of keyscore into dicts."""
+    return [{"tonic": tonic, "scale": scale, "confidence": confidence}
+            for tonic, scale, confidence in found]
+
+
+def analyse(path, top=3, window=None, chords=False):
+    """Returns the keys of a WAV file, and of each of its windows.
+
+    Args:
+        path (str): path of the file.
+        top (int): number of keys returned, for the file and each window.
+        window (float): length of each window in seconds. If None, only
+            the keys of the whole recording are returned.
+        chords (bool): if true, each window also gets the chord sounding
+            the most in it, spelled in the key of the recording.
+
+    Returns:
+        dict: the file's path, its length in seconds, its keys and, with a
+            window, the start, keys and chord of each window.
+
+    Raises:
+        ValueError: if the file can't be read.
+    """
+    with WaveFile(path) as wave:
+        rate = wave.rate
+        record = {"file": path, "seconds": round(wave.frames / rate, 3),
+                  "keys": []}
+        histograms, basses = windows(wave, window)
+
+    total = histograms.sum(axis=0)
+    if total.any():
+        record["keys"] = _keys(keyscore.rank_weighted_many(total[None],
+                                                           top)[0])
+    if window:
+        # The windows are ranked all at once.
+        ranked = (keyscore.rank_weighted_many(histograms, top)
+                  if len(histograms) else [])
+        names = None
+        if record["keys"]:
+            key = record["keys"][0]
+            names = transpose.key_spelling(base.pitch_class(key["tonic"]),
+                                           key["scale"])
+        record["windows"] = []
+        for number, (histogram, keys) in enumerate(zip(histograms, ranked)):
+            entry = {"start": round(number * window, 3),
+                     "keys": _keys(keys) if histogram.any() else []}
+            if chords:
+                # Without a loud enough bass, the chord is named on its root.
+                bass = basses[number]
+                lowest = (int(bass.argmax())
+                          if bass.max() >= BASS_SHARE * histogram.max()
+                          else None)
+                entry["chord"] = chordindex.label(histogram.tolist(), lowest,
+                                                  names)
+            record["windows"].append(entry)
+    return record
+
+
+def analyse_many(paths, workers=1, **options):
+    """Yields the records of 'analyse' for many files, in input order.
+
+    A file that can't be read gives a record with its path and the error.
+
+    Args:
+        paths (iterable): paths of WAV files.
+        workers (int): number of processes, see 'parallel.analyse_files'.
+        options: the arguments of 'analyse' after the path.
+    """
+    return parallel.analyse_files(analyse, paths, workers, **options)
+
+
+def main(argv=None):
+    """Analyses WAV files and folders, one JSON line per file.
+
+    Returns:
+        int: 0 if every file was read, 1 otherwise.
+    """
+    parser = argparse.ArgumentParser(
+        description="Find the keys and chords of WAV recordings.")
+    parser.add_argument("paths", nargs="+", help="WAV files or folders")
+    parser.add_argument("--window", type=float,
+                        help="also analyse windows of this many seconds")
+    parser.add_argument("--top", type=int, default=3)
+    parser.add_argument("--chords", action="store_true",
+                        help="name the chord of each window")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of processes, 0 for one per CPU "
+                             "(default: 1)")
+    args = parser.parse_args(argv)
+
+    status = 0
+    paths = parallel.find_files(args.paths, EXTENSIONS)
+    for record in analyse_many(paths, args.workers or None, top=args.top,
+                               window=args.window, chords=args.chords):
+        status |= "error" in record
+        sys.stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
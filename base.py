@@ -6,11 +6,42 @@ Vars:
         roman numerals and their corresponding semitone number.
     chords_dict (dict): Pairs chord symbols with their corresponding semitone
         number from the tonic.
+    note_index (dict): Pairs every spelling of a note, from double flat to
+        double sharp ("Cbb" to "B##", "x" also standing for "##"), with its
+        pitch class, an integer from 0 (C) to 11 (B).
+    sharps, flats (list): The 12 notes spelled with sharps or with flats.
+    FULL_MASK (int): 12-bit mask with every pitch class set.
+
+Pitch classes are integers 0-11 and sets of them (chords, scales) are 12-bit
+masks in which bit 'n' is set when pitch class 'n' is present. Transposing a
+set is a rotation of its mask, and membership or overlap checks are a bitwise
+'and' followed by a popcount. Note names are only used at the edges.
+
+Spellings are looked up in 'note_index' with a single dict access, and the
+way a pitch class is written out depends on its context: 'spell' follows the
+accident of a tonic, and 'spell_scale' gives each degree of a 7-note scale
+its own letter, so that the scale of Eb has Ab and that of E has G#, as
+'spell_degree' does for the notes of a chord.
 
 Functions:
     check_accident: Checks if a symbol in a chord string is sharp or flat.
+    pitch_class: Returns the pitch class of a note name.
+    note_name: Returns the note name of a pitch class.
+    spell: Returns the name of a pitch class in the spelling of a tonic.
+    spell_scale: Returns the notes of a scale on a tonic, one per letter.
+    spell_degree: Returns a note some letters and semitones above a tonic.
+    notes_mask: Returns the mask of a collection of note names.
+    mask_pitches: Returns the pitch classes set in a mask.
+    mask_notes: Returns the note names set in a mask.
+    rotate: Transposes a mask by a number of semitones.
+    popcount: Returns the number of pitch classes set in a mask.
+    interval_note: Returns the note a number of semitones above another.
     return_degree: Returns the second note of an interval.
+
+Imports:
+    functools: caches the spelling of degrees.
 """
+import functools
 
 
 notes = ["C", "C#", "D", "Eb", "E", "F",
@@ -21,6 +52,19 @@ degrees_dict = {"I": 0, "ii": 1, "II": 2, "iii": 3, "III": 4,
 chords_dict = {"2": 2, "9": 2, "m": 3, "4": 5, "11": 5,
                "5-": 6, "º": 6, "dim": 6, "5": 7, "5+": 8,
                "6": 9, "13": 9, "7": 10, "7M": 11}
+sharps = ["C", "C#", "D", "D#", "E", "F",
+          "F#", "G", "G#", "A", "A#", "B"]
+flats = ["C", "Db", "D", "Eb", "E", "F",
+         "Gb", "G", "Ab", "A", "Bb", "B"]
+FULL_MASK = 0xFFF
+
+_letters = "CDEFGAB"
+_naturals = (0, 2, 4, 5, 7, 9, 11)
+_accidents = {"bb": -2, "b": -1, "": 0, "#": 1, "##": 2, "x": 2}
+_symbols = {-2: "bb", -1: "b", 0: "", 1: "#", 2: "##"}
+note_index = {letter + accident: (natural + shift) % 12
+              for letter, natural in zip(_letters, _naturals)
+              for accident, shift in _accidents.items()}
 
 
 def check_accident(chord_string, symbol):
@@ -61,22 +105,138 @@ def check_accident(chord_string, symbol):
         return 0
 
 
+def pitch_class(note):
+    """Returns the pitch class of a note name.
+
+    Args:
+        note (str): note from the chromatic scale. i.e: "Eb"
+
+    Raises:
+        ValueError: if the note is not in 'note_index'.
+    """
+    try:
+        return note_index[note]
+    except KeyError:
+        raise ValueError("{!r} is not a note".format(note)) from None
+
+
+def note_name(pitch):
+    """Returns the note name of a pitch class, wrapping around the octave."""
+    return notes[pitch % 12]
+
+
+def spell(pitch, tonic=""):
+    """Returns the name of a pitch class in the spelling of a tonic.
+
+    Tonics with a flat are followed by flats and tonics with a sharp by
+    sharps. Natural tonics keep the spelling of 'notes'.
+
+    Args:
+        pitch (int): pitch class, wrapping around the octave.
+        tonic (str): note whose accident is followed. i.e: "Db"
+    """
+    if tonic[1:2] == "b":
+        return flats[pitch % 12]
+    if tonic[1:2] in ("#", "x"):
+        return sharps[pitch % 12]
+    return notes[pitch % 12]
+
+
+def spell_scale(tonic, steps):
+    """Returns the notes of a scale on a tonic, in the spelling of its key.
+
+    In a scale of 7 notes each degree takes the next letter from the
+    tonic's, with the accident that gives its pitch class, so no letter is
+    used twice ("Eb F G Ab Bb C D", not "Eb F G G# Bb C D"). Other scales,
+    and degrees that would need more than a double accident, follow 'spell'.
+
+    Args:
+        tonic (str): first note of the scale, in any spelling of
+            'note_index'.
+        steps (tuple): semitones of each degree from the tonic, ascending.
+
+    Returns:
+        tuple: the notes of the scale, in the order of 'steps'.
+    """
+    if len(steps) != 7:
+        root = pitch_class(tonic)
+        return tuple(spell(root + step, tonic) for step in steps)
+    return tuple(spell_degree(tonic, degree, step)
+                 for degree, step in enumerate(steps))
+
+
+@functools.cache
+def spell_degree(tonic, letters, semitones):
+    """Returns the note a number of letters and semitones above the tonic.
+
+    The note takes the letter 'letters' steps above the tonic's, with the
+    accident that gives it the right pitch class, as degrees are spelled.
+    i.e: spell_degree("Db", 6, 10) is "Cb", the minor seventh of Db. If
+    that needs more than a double accident, the note follows 'spell'. The
+    spellings are cached, as chords and scales ask for the same ones.
+
+    Args:
+        tonic (str): note in any spelling of 'note_index'.
+        letters (int): letters above the tonic's, 2 for a third.
+        semitones (int): semitones above the tonic.
+    """
+    # Looked up first, so a tonic that isn't a note raises its ValueError.
+    pitch = pitch_class(tonic) + semitones
+    index = (_letters.index(tonic[0]) + letters) % 7
+    shift = (pitch - _naturals[index] + 6) % 12 - 6
+    if shift in _symbols:
+        return _letters[index] + _symbols[shift]
+    return spell(pitch, tonic)
+
+
+def notes_mask(note_list):
+    """Returns the 12-bit mask of a collection of note names."""
+    mask = 0
+    for note in note_list:
+        mask |= 1 << pitch_class(note)
+    return mask
+
+
+def mask_pitches(mask, start=0):
+    """Returns the pitch classes set in a mask, ascending from 'start'."""
+    return [(start + step) % 12 for step in range(12)
+            if mask >> ((start + step) % 12) & 1]
+
+
+def mask_notes(mask, start=0):
+    """Returns the note names set in a mask, ascending from 'start'."""
+    return [notes[pitch] for pitch in mask_pitches(mask, start)]
+
+
+def rotate(mask, steps):
+    """Transposes a mask up by 'steps' semitones (down if negative)."""
+    steps %= 12
+    return ((mask << steps) | (mask >> (12 - steps))) & FULL_MASK
+
+
+def popcount(mask):
+    """Returns the number of pitch classes set in a mask."""
+    return mask.bit_count()
+
+
+def interval_note(tonic, semitones):
+    """Returns the note 'semitones' above the tonic, wrapping the octave.
+
+    The note is spelled as 'spell' does for the tonic.
+    """
+    return spell(pitch_class(tonic) + semitones, tonic)
+
+
 def return_degree(tonic, degree):
     """Returns the second note of an interval.
 
-    Given a tonic and a degree, this function will assign the tonic
-    to its index in the list of notes and then sum it with the number
-    of semitones associated with the degree in its dictionary. Then,
-    return a note from the aforementioned list with the new index.
+    Given a tonic and a degree, this function will take the pitch class of
+    the tonic and sum it with the number of semitones associated with the
+    degree in its dictionary. Then, return the note of the new pitch class.
 
     Args:
         tonic (str): note from the chromatic scale
         degree (str): degree between unison ("I") and major seventh
         ("VII"), minor and diminisheds are written in lowercase.
     """
-    tonic = notes.index(tonic)
-    tonic += degrees_dict[degree]
-
-    if tonic > 11:
-        tonic = tonic - 12
-    return notes[tonic]
+    return interval_note(tonic, degrees_dict[degree])
@@ -0,0 +1,403 @@
+"""Module to benchmark the hot paths of the script on synthetic corpora.
+
+Each case runs one path over a corpus from 'corpusgen' of a given size and
+reports its throughput, in items per second, from the fastest of a few runs,
+and the peak of the memory it allocates, traced by 'tracemalloc' in one more
+run, as tracing slows down the others. The corpus is generated before any
+run, so none counts it.
+
+The results can be saved as a JSON baseline and later runs compared against
+it: a case whose throughput falls, or whose peak memory grows, by more than
+the tolerance is a regression, and the exit status is 1.
+
+'--footprint N' instead measures the memory kept per chord by a corpus of N
+chords, held as FrozenChord references or as decomposed Chord objects.
+
+'--threads N' instead runs the stateless functions of 'api' from 1 to N
+threads at once, over progressions as many as the first of the sizes,
+checking every answer against a single thread's, and reports the
+throughput of each number of threads and its speedup over one.
+
+Run as a script:
+    python benchmark.py [--sizes 1000,100000,1000000] [--cases NAME,...]
+                        [--seed N] [--repeat N] [--save PATH]
+                        [--compare PATH]
+                        [--tolerance FRACTION] [--no-memory]
+    python benchmark.py --footprint N
+    python benchmark.py --threads N [--sizes SIZE] [--seed N]
+
+Imports:
+    argparse, json, random, sys, time, tracemalloc: handle the command
+        line, draw scale names, time the cases and trace their memory.
+    baseclasses: contains the Chord and Scale classes.
+    chordcomposer: contains the Chord class that can be composed.
+    corpusgen: generates the corpora.
+    keyfinder: contains the functions of the key finder.
+    scalemaker: declares the scales.
+    api, concurrent.futures: run the stateless functions on threads, for
+        '--threads' only.
+
+Vars:
+    cases (dict): pairs the name of each case with the function generating
+        its corpus and the function running it.
+    SIZES (tuple): default sizes of the corpora.
+
+Functions:
+    run_case(): times one case on one size and traces its memory.
+    footprint(): measures the memory kept per chord by a corpus.
+    threads(): runs the functions of 'api' on several threads at once.
+    run(): runs several cases on several sizes.
+    compare(): returns the regressions of results against a baseline.
+    report(): formats results, with their change against a baseline.
+    main(): runs the benchmark from the command line.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+import baseclasses
+import chordcomposer
+import corpusgen
+import keyfinder
+import scalemaker
+
+SIZES = (1000, 100000, 1000000)
+
+
+def _decompose(names):
+    """Case decomposing chord names."""
+    for name in names:
+        chord = baseclasses.Chord(name)
+        chord.decompose()
+
+
+def _compose(note_strings):
+    """Case composing chords from their notes, with every inversion."""
+    for notes in note_strings:
+        chord = chordcomposer.Chord("", notes)
+        chord.compose(rotate=True)
+
+
+def _apply(scale_names):
+    """Case applying scales to the 12 keys."""
+    for name in scale_names:
+        baseclasses.Scale.apply(name)
+
+
+def _input_decompose(progressions):
+    """Case gathering the distinct notes of progressions."""
+    for chords in progressions:
+        keyfinder.input_decompose([baseclasses.Chord(name)
+                                   for name in chords])
+
+
+def _compare(note_lists):
+    """Case comparing the notes of progressions with the major keys."""
+    major = baseclasses.Scale.apply("M")
+    for notes in note_lists:
+        keyfinder.compare(notes, major, True)
+
+
+def _scale_names(count, seed=0):
+    """Corpus of the names of the declared scales, drawn at random."""
+    generator = random.Random(seed)
+    names = list(baseclasses.Scale.name_struct)
+    return (generator.choice(names) for _ in range(count))
+
+
+def _note_strings(count, seed=0):
+    """Corpus of the notes of chords, as 'Chord' takes them."""
+    return (" ".join(notes) for notes in corpusgen.note_sets(count, seed))
+
+
+cases = {"decompose": (corpusgen.chord_names, _decompose),
+         "compose": (_note_strings, _compose),
+         "apply": (_scale_names, _apply),
+         "input_decompose": (corpusgen.progressions, _input_decompose),
+         "compare": (corpusgen.progression_notes, _compare)}
+
+
+def run_case(name, size, seed=0, memory=True, repeat=3):
+    """Times one case on a corpus of one size and traces its memory.
+
+    Args:
+        name (str): name of the case, a key of 'cases'.
+        size (int): number of items of the corpus.
+        seed (int): seed of the corpus.
+        memory (bool): if false, the memory is not traced.
+        repeat (int): number of timed runs, the fastest is kept.
+
+    Returns:
+        dict: the seconds taken by the fastest run, the items per second
+            and the peak of memory allocated in KiB (None if not traced).
+    """
+    generate, function = cases[name]
+    items = list(generate(size, seed))
+
+    seconds = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(items)
+        elapsed = time.perf_counter() - start
+        seconds = elapsed if seconds is None else min(seconds, elapsed)
+
+    peak = None
+    if memory:
+        tracemalloc.start()
+        try:
+            function(items)
+            peak = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+        finally:
+            tracemalloc.stop()
+
+    return {"seconds": round(seconds, 4),
+            "per_second": round(size / seconds) if seconds else None,
+            "peak_kib": peak}
+
+
+def footprint(count, seed=0, sample=100000):
+    """Measures the memory kept per chord by a corpus of chords.
+
+    Builds a list of 'count' FrozenChord references, and a list of
+    decomposed Chord objects of at most 'sample' chords, as holding more of
+    them may not fit in memory, and traces what each list keeps allocated.
+
+    Args:
+        count (int): number of chords of the FrozenChord corpus.
+        seed (int): seed of the corpus.
+        sample (int): largest number of Chord objects built.
+
+    Returns:
+        dict: pairs "FrozenChord" and "Chord" with the number of chords
+            built, the bytes kept and the bytes kept per chord.
+    """
+    def frozen(names):
+        return [baseclasses.FrozenChord(name) for name in names]
+
+    def decomposed(names):
+        chords = []
+        for name in names:
+            chord = baseclasses.Chord(name)
+            chord.decompose()
+            chords.append(chord)
+        return chords
+
+    output = {}
+    for kind, build, size in (("FrozenChord", frozen, count),
+                              ("Chord", decomposed, min(count, sample))):
+        tracemalloc.start()
+        try:
+            corpus = build(corpusgen.chord_names(size, seed))
+            kept = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+        del corpus
+        output[kind] = {"chords": size, "bytes": kept,
+                        "per_chord": round(kept / size, 1)}
+
+    return output
+
+
+def _api_work(progressions):
+    """Analyses progressions through 'api', as one task of 'threads'."""
+    import api
+
+    output = []
+    for chords in progressions:
+        notes = [api.decompose(name) for name in chords]
+        output.append((notes, api.identify(notes[0]),
+                       api.rank_keys(chords),
+                       api.rank_keys(chords, weighted=True)))
+    return output
+
+
+def threads(most, size, seed=0, tasks=4):
+    """Runs the functions of 'api' on 1 to 'most' threads at once.
+
+    The corpus is split into 'tasks' slices per thread, run by a
+    ThreadPoolExecutor, and every answer is checked against those of a
+    single thread without the executor. With the GIL, the throughput stays
+    about that of one thread; free-threaded builds run the threads in
+    parallel, up to the number of CPUs.
+
+    Args:
+        most (int): largest number of threads.
+        size (int): number of progressions of the corpus.
+        seed (int): seed of the corpus.
+        tasks (int): slices of the corpus per thread.
+
+    Returns:
+        list: for each number of threads, a tuple of the number, the
+            progressions analysed per second and whether every answer was
+            right.
+    """
+    import concurrent.futures
+
+    corpus = list(corpusgen.progressions(size, seed))
+    expected = _api_work(corpus)
+    output = []
+    for count in range(1, most + 1):
+        step = -(-size // (count * tasks))
+        slices = [corpus[start:start + step]
+                  for start in range(0, size, step)]
+        with concurrent.futures.ThreadPoolExecutor(count) as executor:
+            start = time.perf_counter()
+            answers = [answer for part in executor.map(_api_work, slices)
+                       for answer in part]
+            elapsed = time.perf_counter() - start
+        output.append((count, round(size / elapsed, 1),
+                       answers == expected))
+    return output
+
+
+def run(names=None, sizes=SIZES, seed=0, memory=True, repeat=3):
+    """Runs several cases on several sizes.
+
+    Returns:
+        dict: for each case, the results of 'run_case' by size, the sizes
+            as strings so the results can be saved as JSON.
+    """
+    scalemaker.register()
+    results = {}
+    for name in names or cases:
+        results[name] = {str(size): run_case(name, size, seed, memory,
+                                             repeat)
+                         for size in sizes}
+    return results
+
+
+def compare(results, baseline, tolerance=0.2):
+    """Returns the regressions of results against a baseline.
+
+    Only the cases and sizes found in both are compared.
+
+    Args:
+        results (dict): results of 'run'.
+        baseline (dict): earlier results of 'run'.
+        tolerance (float): share by which the throughput may fall, or the
+            peak memory grow, before it is a regression.
+
+    Returns:
+        list: tuples of (case, size, measure, baseline value, value).
+    """
+    regressions = []
+    for name, sizes in results.items():
+        for size, result in sizes.items():
+            before = baseline.get(name, {}).get(size)
+            if not before:
+                continue
+            if (before["per_second"] and result["per_second"]
+                    and result["per_second"]
+                    < before["per_second"] * (1 - tolerance)):
+                regressions.append((name, size, "per_second",
+                                    before["per_second"],
+                                    result["per_second"]))
+            if (before["peak_kib"] and result["peak_kib"]
+                    and result["peak_kib"]
+                    > before["peak_kib"] * (1 + tolerance)):
+                regressions.append((name, size, "peak_kib",
+                                    before["peak_kib"], result["peak_kib"]))
+    return regressions
+
+
+def report(results, baseline=None):
+    """Formats results as a table, with their change against a baseline."""
+    lines = ["{:<16}{:>9}{:>10}{:>14}{:>12}".format(
+        "case", "size", "seconds", "items/s", "peak KiB")]
+    for name, sizes in results.items():
+        for size, result in sizes.items():
+            line = "{:<16}{:>9}{:>10.3f}{:>14,}{:>12}".format(
+                name, size, result["seconds"], result["per_second"] or 0,
+                "-" if result["peak_kib"] is None else result["peak_kib"])
+            before = (baseline or {}).get(name, {}).get(size)
+            if before and before["per_second"] and result["per_second"]:
+                line += "  {:+.0%}".format(
+                    result["per_second"] / before["per_second"] - 1)
+            lines.append(line)
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    """Runs the benchmark, saving or comparing against a baseline.
+
+    Returns:
+        int: 1 if any case regressed against the baseline, 0 otherwise.
+    """
+    parser = argparse.ArgumentParser(
+        description="Benchmark the hot paths on synthetic corpora.")
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)),
+                        help="comma-separated sizes of the corpora")
+    parser.add_argument("--cases", default=",".join(cases),
+                        help="comma-separated names of the cases")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="timed runs per case, the fastest is kept")
+    parser.add_argument("--save", help="write the results to a JSON file")
+    parser.add_argument("--compare", help="compare with a JSON baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="share of change allowed before a regression")
+    parser.add_argument("--no-memory", action="store_true",
+                        help="skip the traced run measuring peak memory")
+    parser.add_argument("--footprint", type=int, metavar="N",
+                        help="only measure the memory kept per chord by a "
+                             "corpus of N chords")
+    parser.add_argument("--threads", type=int, metavar="N",
+                        help="only run 'api' on 1 to N threads, over the "
+                             "first of the sizes, checking the answers")
+    args = parser.parse_args(argv)
+
+    if args.threads:
+        size = int(args.sizes.split(",")[0])
+        single = None
+        status = 0
+        for count, per_second, right in threads(args.threads, size,
+                                                args.seed):
+            single = single or per_second
+            print("{:>3} threads{:>14,.1f}/s{:>8.2f}x  {}".format(
+                count, per_second, per_second / single,
+                "ok" if right else "WRONG ANSWERS"))
+            status |= not right
+        return status
+
+    if args.footprint:
+        for kind, result in footprint(args.footprint, args.seed).items():
+            print("{:<12}{:>10} chords{:>14,} bytes{:>10} bytes/chord".format(
+                kind, result["chords"], result["bytes"],
+                result["per_chord"]))
+        return 0
+
+    names = args.cases.split(",")
+    unknown = [name for name in names if name not in cases]
+    if unknown:
+        parser.error("unknown cases: {}".format(", ".join(unknown)))
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            baseline = json.load(file)
+
+    results = run(names, sizes, args.seed, not args.no_memory,
+                  args.repeat)
+    print(report(results, baseline))
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+    status = 0
+    if baseline is not None:
+        for name, size, measure, before, after in compare(
+                results, baseline, args.tolerance):
+            print("REGRESSION {} {} {}: {} -> {}".format(
+                name, size, measure, before, after))
+            status = 1
+
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
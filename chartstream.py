@@ -0,0 +1,203 @@
+"""Module to find the keys of chord charts streamed from files or stdin.
+
+Chains generators that read, parse, decompose, score and emit one song at a
+time, so memory stays flat however large the corpus is. Songs are either one
+per line or, in block mode, groups of lines separated by blank lines. Each
+song is written out as one JSON line with its most probable keys.
+
+Run as a script to read the files given, or stdin if there are none:
+    python chartstream.py [--blocks] [--top N] [--workers N] [FILE ...]
+
+Imports:
+    argparse, json, sys: handle the command line and the input and output.
+    chordparser: parses chord names and returns their pitch-class masks.
+    keyscore: ranks pitch-class vectors against every scale on every key.
+
+Functions:
+    read_lines(): yields the lines of files, or of stdin.
+    read_songs(): groups lines into songs.
+    parse_songs(): splits songs into chord names, setting invalid ones apart.
+    decompose_songs(): adds the pitch-class mask of each song's chords.
+    score_songs(): adds the most probable keys of each song.
+    emit(): writes each song as a JSON line.
+    stream(): chains all of the above.
+    main(): runs 'stream' from the command line.
+"""
+import argparse
+import json
+import sys
+
+import chordparser
+import keyscore
+
+# Tokens of a chart that are not chords, such as bar lines and repeats.
+_separators = {"|", "||", "|:", ":|", "/", "%", "-"}
+
+
+def read_lines(paths=()):
+    """Yields the lines of the files in 'paths', or of stdin if empty.
+
+    Args:
+        paths (list): paths of text files, "-" standing for stdin.
+    """
+    if not paths:
+        paths = ["-"]
+    for path in paths:
+        if path == "-":
+            yield from sys.stdin
+            continue
+        with open(path, encoding="utf-8", errors="replace") as file:
+            yield from file
+
+
+def read_songs(lines, blocks=False, separator=" "):
+    """Groups lines into songs, yielding the song's number and its text.
+
+    Args:
+        lines (iterable): lines of one or more charts.
+        blocks (bool): if true, a song is a group of lines ending in a blank
+            line, otherwise each non-blank line is a song.
+        separator (str): joins the lines of a song in block mode, "\n" to
+            keep them apart.
+    """
+    number = 0
+    block = []
+    for line in lines:
+        line = line.strip()
+        if not blocks:
+            if line:
+                yield number, line
+                number += 1
+        elif line:
+            block.append(line)
+        elif block:
+            yield number, separator.join(block)
+            number += 1
+            block = []
+
+    if block:
+        yield number, separator.join(block)
+
+
+def parse_songs(songs):
+    """Splits each song into its chords, setting invalid names apart.
+
+    Yields:
+        dict: the song's number, its valid chord names and invalid tokens.
+    """
+    for number, text in songs:
+        chords = []
+        invalid = []
+        for token in text.split():
+            if token in _separators:
+                continue
+            try:
+                chordparser.parse(token)
+            except ValueError:
+                invalid.append(token)
+            else:
+                chords.append(token)
+        yield {"song": number, "chords": chords, "invalid": invalid}
+
+
+def decompose_songs(records):
+    """Adds to each song the pitch-class mask of all of its chords."""
+    for record in records:
+        mask = 0
+        for name in record["chords"]:
+            mask |= chordparser.chord_mask(name)
+        record["mask"] = mask
+        yield record
+
+
+def score_songs(records, top=3):
+    """Adds to each song its 'top' most probable keys."""
+    for record in records:
+        if record["mask"]:
+            keys = keyscore.rank(keyscore.mask_vector(record["mask"]), top)
+        else:
+            keys = []
+        record["keys"] = [{"tonic": tonic, "scale": scale,
+                           "percentage": percentage}
+                          for tonic, scale, percentage in keys]
+        yield record
+
+
+def emit(records, out=None):
+    """Writes each song as a JSON line, without its list of chords.
+
+    Yields:
+        dict: each record, after writing it.
+    """
+    out = out or sys.stdout
+    for record in records:
+        line = {"song": record["song"], "chords": len(record["chords"]),
+                "keys": record["keys"]}
+        if record["invalid"]:
+            line["invalid"] = record["invalid"]
+        out.write(json.dumps(line, ensure_ascii=False) + "\n")
+        yield record
+
+
+def stream(lines, blocks=False, top=3, out=None, workers=1):
+    """Reads, parses, decomposes, scores and emits songs one at a time.
+
+    Args:
+        lines (iterable): lines of one or more charts.
+        blocks (bool): see 'read_songs'.
+        top (int): number of keys written per song.
+        out (file): where the JSON lines go, stdout by default.
+        workers (int): number of processes, see 'parallel.keyfind_songs'.
+
+    Returns:
+        int: number of songs processed.
+    """
+    songs = read_songs(lines, blocks)
+    if workers == 1:
+        records = score_songs(decompose_songs(parse_songs(songs)), top)
+    else:
+        # Imported here since 'parallel' imports this module.
+        import parallel
+        records = parallel.keyfind_songs(songs, top, workers)
+
+    records = emit(records, out)
+    count = 0
+    for _ in records:
+        count += 1
+
+    return count
+
+
+def _positive(text):
+    """Reads a number of results from the command line, at least 1."""
+    try:
+        value = int(text)
+    except ValueError:
+        value = None
+    if value is None or value < 1:
+        raise argparse.ArgumentTypeError(
+            "must be a whole number from 1, not {!r}".format(text))
+    return value
+
+
+def main(argv=None):
+    """Runs 'stream' over the files in the command line, or stdin."""
+    parser = argparse.ArgumentParser(
+        description="Find the keys of chord charts, one JSON line per song.")
+    parser.add_argument("files", nargs="*",
+                        help="chart files, stdin if none or '-'")
+    parser.add_argument("--blocks", action="store_true",
+                        help="songs are separated by blank lines")
+    parser.add_argument("--top", type=_positive, default=3,
+                        help="number of keys per song (default: 3)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of processes, 0 for one per CPU "
+                             "(default: 1)")
+    args = parser.parse_args(argv)
+
+    stream(read_lines(args.files), args.blocks, args.top,
+           workers=args.workers or None)
+
+
+if __name__ == "__main__":
+    main()
@@ -87,10 +87,13 @@ def compose(self, rotate=False):
         i += 1
 
 
-baseclasses.Chord.triad_compose = triad_compose
-baseclasses.Chord.tetrad_compose = tetrad_compose
-baseclasses.Chord.extended_compose = extended_compose
-baseclasses.Chord.compose = compose
+class Chord(baseclasses.Chord):
+    """Chord that can also be composed, finding its name from its notes."""
+
+    triad_compose = triad_compose
+    tetrad_compose = tetrad_compose
+    extended_compose = extended_compose
+    compose = compose
 
 
 def run_decompose():
@@ -120,18 +123,28 @@ def run_compose():
               "espaos para que possamos identificar o acorde.\n")
     print(prompt)
     
-    notes = input("Insira: ")
-    chord = baseclasses.Chord("", notes)
-    chord.compose(True)
+    # Imported here since 'chordindex' is built on this module.
+    import chordindex
+
+    notes = input("Insira: ").split()
+    if not notes:
+        print("Nenhuma nota foi inserida.")
+        return
+    names = chordindex.identify(notes)
     
-    resultado = ("Seu acorde pode ser chamado por {}, "
-                 "ou tambm por {}").format(chord.alt_names[0],
-                                            chord.alt_names[1])
-    if len(chord.notes) > 2:
+    resultado = "Seu acorde pode ser chamado por {}".format(names[0])
+    if len(notes) > 1:
+        resultado += ", ou tambm por {}".format(names[1])
         i = 2
-        while i < len(chord.notes):
-            resultado += ", ou por {}".format(chord.alt_names[i])
+        while i < len(notes):
+            resultado += ", ou por {}".format(names[i])
             i += 1
 
+    # The notes of no common chord get odd names, so the nearest common
+    # chord is also given.
+    name, distance = chordindex.nearest(notes, 1)[0]
+    if distance:
+        resultado += ". O acorde comum mais prximo  {}".format(name)
+
     resultado += "."
     print(resultado)
@@ -0,0 +1,272 @@
+"""Module to name chords from their notes through a precomputed index.
+
+The name the composer gives a chord only depends on its root and on the
+intervals of its other notes from the root. So, once for the 2048 interval
+masks that contain the root, the composer is run on the key of C and the part
+of the name after the root is stored. Naming a chord is then a rotation of
+its pitch-class mask and one lookup, for the chord and for each of its
+inversions. The index can be saved to and loaded from a JSON file.
+
+Note sets that no common chord has, as those of a transcription with notes
+missing or added, get odd names from the composer, such as "Csus/b9". The
+fuzzy mode names them after the closest of a few common chords, the
+'TEMPLATES' on each of the 12 roots, by a weighted Hamming distance: the
+weights of the template's notes missing from the set, the root and third
+weighing the most and the fifth the least, plus those of the set's notes
+the template doesn't have. The nearest templates of each of the 4096 masks
+are found once, with NumPy, so each lookup is a list access.
+
+Imports:
+    json: saves and loads the index.
+    base: contains the chromatic scale and pitch-class functions.
+    chordcomposer: contains the Chord class that can be composed.
+    chordparser: returns the masks of the templates.
+
+Vars:
+    TEMPLATES (tuple): suffixes of the common chords of the fuzzy mode, the
+        most common first, which wins ties.
+    MISSING_WEIGHTS (dict): weight of a template's note missing from a set,
+        by its interval from the root, 1 if not found.
+    EXTRA_WEIGHT (float): weight of a set's note missing from a template.
+    NEAREST (int): number of templates kept for each mask.
+    LABEL_SHARE (float): share of the weight of the most sounding note that
+        others need to be part of a chord named by 'label'.
+
+Functions:
+    build(): runs the composer on every interval mask.
+    table(): returns the index, building it on first use.
+    save(): writes the index to a JSON file.
+    load(): reads the index from a JSON file.
+    name(): names a chord from its root and pitch-class mask.
+    identify(): names a chord from its notes, and each of its inversions.
+    identify_many(): the same as 'identify', for many chords.
+    build_nearest(): finds the nearest templates of every mask.
+    nearest_mask(): returns the nearest templates of a mask.
+    nearest(): names a chord from its notes after the nearest templates.
+    nearest_many(): the same as 'nearest', for many chords.
+    label(): names the chord sounding the most in a pitch-class histogram.
+"""
+import json
+
+import base
+import chordcomposer
+import chordparser
+
+# "dim(6)" is the diminished seventh chord, as "dim7" is read with a minor
+# seventh.
+TEMPLATES = ("", "m", "7", "m7", "7M", "5", "sus4", "sus2", "dim", "aug",
+             "6", "m6", "m7(b5)", "dim(6)", "m7M", "7sus4", "add9",
+             "madd9", "7(9)", "m7(9)", "7M(9)", "6(9)", "7(b9)", "7(#9)",
+             "7(13)", "7(b5)", "aug7", "7(#11)", "m7(11)")
+MISSING_WEIGHTS = {0: 2.0, 3: 1.5, 4: 1.5, 7: 0.5, 10: 1.25, 11: 1.25}
+EXTRA_WEIGHT = 1.0
+NEAREST = 8
+LABEL_SHARE = 0.3
+
+_index = []
+_nearest = []
+
+
+def build():
+    """Runs the composer on every interval mask containing the root.
+
+    Returns:
+        list: 4096 name suffixes, indexed by interval mask, None for the
+            masks without the root.
+    """
+    suffixes = [None] * 4096
+    for mask in range(1, 4096, 2):
+        chord = chordcomposer.Chord("", " ".join(base.mask_notes(mask)))
+        chord.compose()
+        suffixes[mask] = chord.name[len(chord.root):]
+
+    return suffixes
+
+
+def table():
+    """Returns the index, building it the first time it is needed."""
+    if not _index:
+        _index[:] = build()
+    return _index
+
+
+def save(path):
+    """Writes the index to a JSON file."""
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(table(), file)
+
+
+def load(path):
+    """Reads the index from a JSON file written by 'save'.
+
+    Raises:
+        ValueError: if the file doesn't hold an index of 4096 entries.
+    """
+    with open(path, encoding="utf-8") as file:
+        suffixes = json.load(file)
+    if not isinstance(suffixes, list) or len(suffixes) != 4096:
+        raise ValueError("{} does not hold a chord index".format(path))
+    _index[:] = suffixes
+
+
+def name(root, mask, spelling=None):
+    """Names the chord with a root and a pitch-class mask.
+
+    Args:
+        root (int): pitch class of the root, added to the mask.
+        mask (int): pitch-class mask of the chord's notes.
+        spelling (str): how to write the root, the note of 'base.notes' by
+            default.
+    """
+    intervals = base.rotate(mask | 1 << root, -root)
+    return (spelling or base.notes[root]) + table()[intervals]
+
+
+def identify(notes):
+    """Names a chord from its notes, and each of its inversions.
+
+    Args:
+        notes (list): note names, the root first.
+
+    Returns:
+        list: the chord's name with each note as the root, in the order of
+            the notes, as 'Chord.compose' gives with 'rotate'.
+    """
+    mask = base.notes_mask(notes)
+    return [name(base.pitch_class(note), mask, note) for note in notes]
+
+
+def identify_many(note_lists):
+    """Yields the names of many chords, as 'identify' returns them."""
+    for notes in note_lists:
+        yield identify(notes)
+
+
+def build_nearest(size=NEAREST):
+    """Finds the nearest templates of every pitch-class mask.
+
+    The distances of the 4096 masks to the templates on every root are
+    two matrix products, of the notes each mask lacks by the weights of
+    the templates' notes and of the notes each mask has by the notes the
+    templates lack.
+
+    Returns:
+        list: for each mask, the 'size' nearest templates as tuples of
+            (root, index in 'TEMPLATES', distance), the nearest first.
+    """
+    # Imported here so that naming chords exactly doesn't load NumPy.
+    import numpy as np
+
+    notes = np.zeros((len(TEMPLATES) * 12, 12))
+    weights = np.zeros((len(TEMPLATES) * 12, 12))
+    roots = []
+    for row, (index, suffix) in enumerate(
+            (index, suffix) for index, suffix in enumerate(TEMPLATES)
+            for _ in range(12)):
+        root = row % 12
+        roots.append((root, index))
+        for pitch in base.mask_pitches(chordparser.chord_mask("C" + suffix)):
+            notes[row, (root + pitch) % 12] = 1
+            weights[row, (root + pitch) % 12] = MISSING_WEIGHTS.get(pitch, 1)
+
+    bits = (np.arange(4096)[:, None] >> np.arange(12)) & 1
+    distances = (1 - bits) @ weights.T + EXTRA_WEIGHT * bits @ (1 - notes).T
+    # A stable sort leaves ties in the order of 'TEMPLATES'.
+    order = np.argsort(distances, axis=1, kind="stable")[:, :size]
+    nearest = np.take_along_axis(distances, order, axis=1)
+    return [tuple(roots[template] + (round(float(distance), 2),)
+                  for template, distance in zip(templates, row))
+            for templates, row in zip(order.tolist(), nearest)]
+
+
+def nearest_mask(mask, bass=None, top=3):
+    """Returns the nearest templates of a pitch-class mask.
+
+    Args:
+        mask (int): pitch-class mask of the notes.
+        bass (int): pitch class of the lowest note, if known. Templates on
+            it go first among those at the same distance.
+        top (int): number of templates returned, at most 'NEAREST'.
+
+    Returns:
+        list: tuples of (root, suffix, distance), the nearest first.
+    """
+    if not _nearest:
+        _nearest[:] = build_nearest()
+    if not mask:
+        return []
+    found = _nearest[mask]
+    if bass is not None:
+        found = sorted(found, key=lambda entry: (entry[2], entry[0] != bass))
+    return [(root, TEMPLATES[index], distance)
+            for root, index, distance in found[:top]]
+
+
+def nearest(notes, top=3):
+    """Names a chord from its notes after its nearest templates.
+
+    The first note is taken as the bass: templates on it go first among
+    those at the same distance, and it follows a "/" when it isn't the
+    template's root. The notes keep the spelling they have in 'notes'.
+
+    Args:
+        notes (list): note names, the bass first.
+        top (int): number of names returned.
+
+    Returns:
+        list: pairs of a name and its distance, the nearest first.
+    """
+    if not notes:
+        return []
+    spelling = {}
+    for note in notes:
+        spelling.setdefault(base.pitch_class(note), note)
+    bass = base.pitch_class(notes[0])
+    output = []
+    for root, suffix, distance in nearest_mask(base.notes_mask(notes), bass,
+                                               top):
+        chord = spelling.get(root, base.notes[root]) + suffix
+        if root != bass:
+            chord += "/" + notes[0]
+        output.append((chord, distance))
+    return output
+
+
+def nearest_many(note_lists, top=3):
+    """Yields the nearest names of many chords, as 'nearest' returns them.
+    """
+    for notes in note_lists:
+        yield nearest(notes, top)
+
+
+def label(weights, bass, spelling=None, share=LABEL_SHARE):
+    """Names the chord sounding the most in a pitch-class histogram.
+
+    The pitch classes weighing at least 'share' of the heaviest one are
+    named by 'nearest', the bass first, as windows of a MIDI file or of a
+    recording are labelled. Without a bass, the nearest template is named
+    on its own root.
+
+    Args:
+        weights (list): weight of each of the 12 pitch classes.
+        bass (int): pitch class of the bass, None if unknown.
+        spelling (tuple): names of the 12 pitch classes, 'base.notes' by
+            default.
+        share (float): share of the heaviest weight a pitch class needs.
+
+    Returns:
+        str: the nearest chord's name, None if nothing sounds.
+    """
+    most = max(weights)
+    if not most:
+        return None
+    spelling = spelling or base.notes
+    mask = sum(1 << pitch for pitch, weight in enumerate(weights)
+               if weight >= most * share)
+    if bass is None:
+        root, suffix, _ = nearest_mask(mask, None, 1)[0]
+        return spelling[root] + suffix
+    bass %= 12
+    notes = [spelling[bass]] + [spelling[pitch] for pitch in range(12)
+                                if mask >> pitch & 1 and pitch != bass]
+    return nearest(notes, 1)[0][0]
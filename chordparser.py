@@ -0,0 +1,292 @@
+"""Module to parse chord symbols in a single pass.
+
+Reads a chord symbol from left to right only once, turning it into a
+structured result with its root, quality, extensions, alterations and bass,
+from which the intervals of its notes can be taken without reading the name
+again. Parsing goes through a bounded LRU cache, since charts repeat the same
+few symbols many times.
+
+Imports:
+    base: Has the chromatic scale and the semitones of each chord symbol.
+
+Classes:
+    ChordSymbol: Structured result of parsing a chord symbol.
+
+Functions:
+    parse(name): Parses a chord symbol, going through the cache.
+    set_cache_size(maxsize): Changes the size limit of the cache.
+    cache_info(): Returns the hits, misses and size of the cache.
+    degrees(symbol): Returns the letters and semitones of a parsed chord's
+        notes.
+    intervals(symbol): Returns the semitones of a parsed chord's notes.
+    chord_notes(name): Returns the notes of a chord symbol.
+    chord_mask(name): Returns the pitch-class mask of a chord symbol.
+"""
+import collections
+import functools
+
+import base
+
+CACHE_SIZE = 1024
+
+# Words and their meaning, tried longest first at each position of the name.
+_words = (("maj", "maj"), ("add", ""), ("sus", "sus"), ("dim", "dim"),
+          ("aug", "aug"), ("no5", "no5"), ("º", "dim"), ("°", "dim"),
+          ("m", "m"), ("-", "m"), ("M", "maj"), ("+", "aug"))
+_ignored = "()[], "
+_accidents = {"b": -1, "#": 1, "-": -1, "+": 1}
+
+
+class ChordSymbol(collections.namedtuple(
+        "ChordSymbol", "root quality extensions alterations bass")):
+    """Structured result of parsing a chord symbol.
+
+    Attributes:
+        root: The chord's first note. i.e: "Eb"
+        quality: The kind of triad, "" for major, "m", "dim", "aug", "sus2",
+            "sus4" or "5" for power chords.
+        extensions: Symbols of 'base.chords_dict' written in the name, in
+            order of appearance, plus "no5" when the fifth is omitted.
+        alterations: Pairs of an extension and its accident in semitones.
+            i.e: (("9", -1),) for "C7(b9)"
+        bass: The bass note of an inversion, or "" if there is none.
+    """
+
+    __slots__ = ()
+
+
+def _read_note(name, i):
+    """Reads a note starting at 'i' and returns it and the next index.
+
+    A doubled accident ("Bbb", "F##") is read as a double flat or sharp,
+    unless a degree follows it, as the second one is then the degree's.
+    An "x" is a double sharp, as in 'base.note_index'.
+    """
+    if i < len(name) and name[i] in "ABCDEFG":
+        if name[i + 1:i + 2] == "x":
+            return name[i:i + 2], i + 2
+        if i + 1 < len(name) and name[i + 1] in "#b":
+            if (name[i + 2:i + 3] == name[i + 1]
+                    and not name[i + 3:i + 4].isdigit()):
+                return name[i:i + 3], i + 3
+            return name[i:i + 2], i + 2
+        return name[i], i + 1
+    return "", i
+
+
+def _read_degree(name, i):
+    """Reads a degree number starting at 'i', preferring "11" and "13"."""
+    if name[i:i + 2] in ("11", "13"):
+        return name[i:i + 2], i + 2
+    return name[i], i + 1
+
+
+def _parse(name):
+    """Parses a chord symbol in a single pass.
+
+    Reads the root, then walks the rest of the name once, matching words
+    (qualities such as "m" or "sus"), degree numbers with their accidents
+    either before ("b9") or after ("5+") them, and a bass note after "/".
+
+    Args:
+        name (str): Chord symbol. i.e: "Dm7(b9)/C"
+
+    Raises:
+        ValueError: if the name has no root or a symbol that isn't known.
+    """
+    root, i = _read_note(name, 0)
+    if not root:
+        raise ValueError("{!r} has no root note".format(name))
+
+    quality = ""
+    extensions = []
+    alterations = []
+    bass = ""
+    while i < len(name):
+        char = name[i]
+        if char in _ignored:
+            i += 1
+            continue
+
+        if char == "/":
+            bass, i = _read_note(name, i + 1)
+            if bass and i < len(name):
+                raise ValueError("{!r} has symbols after the bass "
+                                 "note".format(name))
+            continue
+
+        # An accident before a degree, as in "b9" or "#11".
+        accident = 0
+        if char in "b#" and i + 1 < len(name) and name[i + 1].isdigit():
+            accident = _accidents[char]
+            i += 1
+            char = name[i]
+
+        if char.isdigit():
+            degree, i = _read_degree(name, i)
+            if degree not in base.chords_dict:
+                raise ValueError("{!r} has an unknown degree "
+                                 "{!r}".format(name, degree))
+            if degree == "7" and name[i:i + 1] == "M":
+                degree = "7M"
+                i += 1
+            elif i < len(name) and name[i] in "-+" and not accident:
+                accident = _accidents[name[i]]
+                i += 1
+                # "5-" is read as a diminished chord, the same as "dim".
+                if degree == "5" and accident == -1 and quality == "":
+                    quality = "dim"
+            if degree not in extensions:
+                extensions.append(degree)
+            if accident:
+                alterations.append((degree, accident))
+            continue
+
+        for word, meaning in _words:
+            if name.startswith(word, i):
+                i += len(word)
+                break
+        else:
+            raise ValueError("{!r} has an unknown symbol "
+                             "{!r}".format(name, char))
+
+        if meaning == "maj":
+            # "maj7", "M7" and "maj9" all have a major seventh.
+            if name[i:i + 1].isdigit():
+                degree, i = _read_degree(name, i)
+                extensions.append("7M")
+                if degree not in ("7", "7M"):
+                    extensions.append(degree)
+        elif meaning == "sus":
+            quality = "sus4"
+            if name[i:i + 1] in ("2", "4"):
+                quality = "sus" + name[i]
+                extensions.append(name[i])
+                i += 1
+        elif meaning == "no5":
+            extensions.append(meaning)
+        elif meaning:
+            quality = quality or meaning
+
+    if quality == "" and extensions == ["5"] and not alterations:
+        quality = "5"
+
+    return ChordSymbol(root, quality, tuple(extensions),
+                       tuple(alterations), bass)
+
+
+parse = functools.lru_cache(maxsize=CACHE_SIZE)(_parse)
+
+
+def set_cache_size(maxsize):
+    """Changes the size limit of the parse cache, emptying it.
+
+    Args:
+        maxsize (int): Number of chord symbols kept, or None for no limit.
+    """
+    global parse
+    parse = functools.lru_cache(maxsize=maxsize)(_parse)
+
+
+def cache_info():
+    """Returns the hits, misses, limit and size of the parse cache."""
+    return parse.cache_info()
+
+
+def degrees(symbol):
+    """Returns the degrees of a parsed chord's notes from the root.
+
+    Follows the order in which a chord was always decomposed: second,
+    third, fourth and eleventh, fifth, sixth and seventh. The fifth of an
+    augmented chord ("aug" or "+") is raised, as in "5+": "Caug" is C E G#.
+
+    Args:
+        symbol (ChordSymbol): Result of 'parse'.
+
+    Returns:
+        list: pairs of the letters above the root's (2 for a third) and the
+            semitones above the root, one per note.
+    """
+    chords_dict = base.chords_dict
+    extensions = symbol.extensions
+    quality = symbol.quality
+    altered = dict(symbol.alterations)
+    output = []
+
+    if "9" in extensions or "2" in extensions:
+        output.append((1, chords_dict["9"]
+                       + altered.get("9", altered.get("2", 0))))
+
+    if quality in ("m", "dim"):
+        output.append((2, chords_dict["m"]))
+    elif quality not in ("sus2", "sus4", "5"):
+        output.append((2, base.degrees_dict["III"]))
+
+    if quality == "sus4" or "4" in extensions:
+        output.append((3, chords_dict["4"] + altered.get("4", 0)))
+    if "11" in extensions:
+        output.append((3, chords_dict["11"] + altered.get("11", 0)))
+
+    if "no5" not in extensions:
+        if quality == "dim":
+            output.append((4, chords_dict["5-"]))
+        elif quality == "aug":
+            output.append((4, chords_dict["5+"]))
+        else:
+            output.append((4, chords_dict["5"] + altered.get("5", 0)))
+
+    if "6" in extensions or "13" in extensions:
+        output.append((5, chords_dict["13"]
+                       + altered.get("13", altered.get("6", 0))))
+
+    if "7" in extensions:
+        output.append((6, chords_dict["7"] + altered.get("7", 0)))
+    if "7M" in extensions:
+        output.append((6, chords_dict["7M"]))
+
+    return output
+
+
+def intervals(symbol):
+    """Returns the semitones from the root of a parsed chord's notes.
+
+    Args:
+        symbol (ChordSymbol): Result of 'parse'.
+    """
+    return [semitones for _, semitones in degrees(symbol)]
+
+
+def chord_notes(name):
+    """Returns the notes of a chord symbol, root first and bass last.
+
+    Each note is spelled as the degree it is of the root, so "Db7" has Cb
+    and "Cdim" has Gb (see 'base.spell_degree'). The bass keeps the
+    spelling it has in the name, and is left out if the chord already has
+    its pitch class.
+    """
+    symbol = parse(name)
+    notes = [symbol.root]
+    seen = 1 << base.pitch_class(symbol.root)
+    for letters, semitones in degrees(symbol):
+        note = base.spell_degree(symbol.root, letters, semitones)
+        bit = 1 << base.pitch_class(note)
+        if not seen & bit:
+            seen |= bit
+            notes.append(note)
+    if symbol.bass and not seen & 1 << base.pitch_class(symbol.bass):
+        notes.append(symbol.bass)
+
+    return notes
+
+
+def chord_mask(name):
+    """Returns the pitch-class mask of a chord symbol, without note names."""
+    symbol = parse(name)
+    root = base.pitch_class(symbol.root)
+    mask = 1 << root
+    for semitones in intervals(symbol):
+        mask |= 1 << (root + semitones) % 12
+    if symbol.bass:
+        mask |= 1 << base.pitch_class(symbol.bass)
+
+    return mask
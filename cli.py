@@ -0,0 +1,341 @@
+"""Module with the command line interface of the multi-purpose script.
+
+Handles any number of items per run, taken from the arguments, from files or
+from stdin, one per line, and writes one JSON line (or CSV row) per item, so
+it can be used in shell pipelines. The interactive flow of 'main' is one more
+subcommand.
+
+Usage:
+    python cli.py keyfind [--top N] [CHORDS ...]     i.e: "C F G7 C"
+    python cli.py keyfind --weighted [CHORDS ...]    i.e: "C:2 F:1 G7:1"
+    python cli.py keyfind --cache PATH [CHORDS ...]
+    python cli.py decompose [CHORD ...]              i.e: "Dm7(b9)"
+    python cli.py identify [NOTES ...]               i.e: "C E G Bb"
+    python cli.py identify --fuzzy [--top N] [NOTES ...]  i.e: "C Db G Bb"
+    python cli.py scale [NAME [KEY ...]]             i.e: "m A", "M"
+    python cli.py scales [--top N] [--chords] [NOTES ...]  i.e: "C E F# A"
+    python cli.py voice [--top N] [--guitar | --keyboard] [CHORD ...]
+    python cli.py interactive
+
+Every subcommand but 'interactive' also takes '--file PATH' (repeatable,
+"-" for stdin) and '--format json|csv'. Without arguments or files, items
+are read from stdin. The exit status is 1 if any item could not be handled.
+
+Before the subcommand, '--stages' writes to stderr the time spent in each
+stage and the cache hit rates (see 'instrument'), and '--profile PATH'
+runs the whole command under cProfile, dumping its statistics to PATH, or
+writing a report to stderr if PATH is "-":
+    python cli.py --stages keyfind --file charts.txt
+
+Each subcommand imports only the modules it uses, when it runs, so short
+invocations don't pay for the others (NumPy is only loaded by 'keyfind').
+See 'importcheck' for the measured import time of each subcommand.
+
+Imports:
+    argparse, csv, fileinput, json, sys: handle the command line, input and
+        output.
+    base: contains the chromatic scale.
+    instrument: times the stages and profiles the run, if asked.
+    baseclasses: contains the Chord and Scale classes, for 'decompose' and
+        'scale'.
+    chordindex: names chords from their notes, for 'identify'.
+    keyscore: ranks keys against every scale, for 'keyfind'.
+    keycache: caches the keys of progressions, for 'keyfind --cache'.
+    scalemaker: declares the scales, for 'scale'.
+    scaleindex: finds the scales holding notes, for 'scales'.
+    voicing: finds the voicings of chords, for 'voice'.
+
+Functions:
+    items(): returns the items of a subcommand.
+    keyfind(), decompose(), identify(), scale(), scales(), voice(): handle
+        one item each.
+    run(): runs a subcommand over its items.
+    main(): parses the command line and runs a subcommand.
+"""
+import argparse
+import csv
+import fileinput
+import json
+import sys
+
+import base
+import instrument
+
+
+def items(args):
+    """Returns the items of a subcommand, from arguments, files or stdin."""
+    if args.items:
+        return args.items
+    lines = fileinput.input(args.file or ("-",), encoding="utf-8")
+    return (line.strip() for line in lines if line.strip())
+
+
+def keyfind(item, args):
+    """Returns the most probable keys of a line of chords.
+
+    With '--weighted', chords may be followed by their duration ("C:2") and
+    each key comes with its confidence instead of a percentage. With
+    '--cache', the keys are looked up in a 'keycache' first, kept in a file
+    between runs.
+    """
+    import keyscore
+
+    if args.cache and args.key_cache is None:
+        import keycache
+        args.key_cache = keycache.KeyCache(path=args.cache)
+    cache = args.key_cache
+    if args.weighted:
+        rank = cache.rank_weighted if cache else keyscore.rank_weighted
+        measure = "confidence"
+    else:
+        rank = cache.rank if cache else keyscore.rank_chords
+        measure = "percentage"
+    keys = rank(item.split(), args.top)
+    return {"chords": item,
+            "keys": [{"tonic": tonic, "scale": scale, measure: value}
+                     for tonic, scale, value in keys]}
+
+
+def decompose(item, args):
+    """Returns the notes of a chord name."""
+    import baseclasses
+
+    chord = baseclasses.Chord(item)
+    with instrument.stage("decompose"):
+        chord.decompose()
+    return {"chord": item, "notes": chord.notes}
+
+
+def identify(item, args):
+    """Returns the names of a chord from its notes, one per inversion.
+
+    With '--fuzzy', returns instead the nearest common chords, the first
+    note taken as the bass, with their distances.
+    """
+    import chordindex
+
+    notes = item.split()
+    if args.fuzzy:
+        with instrument.stage("identify"):
+            found = chordindex.nearest(notes, args.top)
+        return {"notes": notes,
+                "nearest": [{"name": name, "distance": distance}
+                            for name, distance in found]}
+    with instrument.stage("identify"):
+        names = chordindex.identify(notes)
+    return {"notes": notes, "names": names}
+
+
+def scale(item, args):
+    """Returns the notes of a scale on one key, or on all keys.
+
+    The item is the name of the scale followed by the keys, if any.
+    """
+    import baseclasses
+    import scalemaker
+
+    scalemaker.register()
+    name, *keys = item.split()
+    if name not in baseclasses.Scale.name_struct:
+        raise ValueError("{!r} is not a scale".format(name))
+    with instrument.stage("scale"):
+        tones = {key: list(baseclasses.Scale.notes(name, key))
+                 for key in keys or base.notes}
+    return {"scale": name, "keys": tones}
+
+
+def scales(item, args):
+    """Returns the scales holding some notes, the fewest extra notes first.
+
+    With '--chords', the item is a line of chord names instead of notes.
+    """
+    import scaleindex
+
+    with instrument.stage("scale"):
+        if args.chords:
+            found = scaleindex.scales_of_chords(item.split(), args.top)
+        else:
+            found = scaleindex.scales_of_notes(item.split(), args.top)
+    return {"notes": item,
+            "scales": [{"tonic": tonic, "scale": name, "extra": extra}
+                       for tonic, name, extra in found]}
+
+
+def voice(item, args):
+    """Returns the cheapest voicings of a chord name."""
+    import voicing
+
+    fingering = None
+    if args.guitar:
+        fingering = voicing.Guitar()
+    elif args.keyboard:
+        fingering = voicing.Keyboard()
+    with instrument.stage("voice"):
+        found = voicing.top(item, args.top, fingering=fingering)
+    return {"chord": item,
+            "voicings": [{"notes": list(names), "pitches": list(pitches),
+                          "cost": cost} for pitches, names, cost in found]}
+
+
+def _rows(record):
+    """Flattens a record into CSV rows, lists joined by spaces."""
+    if "keys" in record and isinstance(record["keys"], list):
+        for rank, key in enumerate(record["keys"], 1):
+            yield [record["chords"], rank, key["tonic"], key["scale"],
+                   key.get("percentage", key.get("confidence"))]
+    elif "keys" in record:
+        for key, notes in record["keys"].items():
+            yield [record["scale"], key, " ".join(notes)]
+    elif "scales" in record:
+        for rank, found in enumerate(record["scales"], 1):
+            yield [record["notes"], rank, found["tonic"], found["scale"],
+                   found["extra"]]
+    elif "nearest" in record:
+        for rank, found in enumerate(record["nearest"], 1):
+            yield [" ".join(record["notes"]), rank, found["name"],
+                   found["distance"]]
+    elif "voicings" in record:
+        for rank, found in enumerate(record["voicings"], 1):
+            yield [record["chord"], rank, " ".join(found["notes"]),
+                   found["cost"]]
+    else:
+        yield [" ".join(value) if isinstance(value, list) else value
+               for value in record.values()]
+
+
+def _positive(text):
+    """Reads a number of results from the command line, at least 1."""
+    try:
+        value = int(text)
+    except ValueError:
+        value = None
+    if value is None or value < 1:
+        raise argparse.ArgumentTypeError(
+            "must be a whole number from 1, not {!r}".format(text))
+    return value
+
+
+def _interactive(args):
+    """Runs the interactive flow of 'main'."""
+    import main as interactive
+    interactive.main()
+    return 0
+
+
+def main(argv=None):
+    """Parses the command line and runs a subcommand over its items.
+
+    Returns:
+        int: 0 if every item was handled, 1 otherwise.
+    """
+    parser = argparse.ArgumentParser(
+        description="Multi-purpose script for musicians.")
+    parser.add_argument("--stages", action="store_true",
+                        help="report the time of each stage on stderr")
+    parser.add_argument("--profile", metavar="PATH",
+                        help="run under cProfile, dumping the statistics "
+                             "to PATH, '-' to report on stderr")
+    commands = parser.add_subparsers(dest="command", required=True)
+    handlers = {"keyfind": (keyfind, "find the key of lines of chords"),
+                "decompose": (decompose, "return the notes of chords"),
+                "identify": (identify, "name chords from their notes"),
+                "scale": (scale, "return the notes of a scale"),
+                "scales": (scales, "return the scales holding notes"),
+                "voice": (voice, "return the best voicings of chords")}
+    for command, (handler, help_text) in handlers.items():
+        subparser = commands.add_parser(command, help=help_text)
+        subparser.add_argument("items", nargs="*")
+        subparser.add_argument("--file", action="append",
+                               help="read items from a file, '-' for stdin")
+        subparser.add_argument("--format", choices=("json", "csv"),
+                               default="json")
+        subparser.set_defaults(handler=handler)
+        if command == "keyfind":
+            subparser.add_argument("--top", type=_positive, default=3)
+            subparser.add_argument("--weighted", action="store_true",
+                                   help="weigh notes by how often and how "
+                                        "long they sound, i.e: \"C:2 G:1\"")
+            subparser.add_argument("--cache", metavar="PATH",
+                                   help="look the keys up in a cache kept "
+                                        "in PATH between runs")
+            subparser.set_defaults(key_cache=None)
+        if command == "identify":
+            subparser.add_argument("--fuzzy", action="store_true",
+                                   help="name the nearest common chords")
+            subparser.add_argument("--top", type=_positive, default=3)
+        if command == "scales":
+            subparser.add_argument("--top", type=_positive, default=10)
+            subparser.add_argument("--chords", action="store_true",
+                                   help="items are chord names, not notes")
+        if command == "voice":
+            subparser.add_argument("--top", type=_positive, default=10)
+            fingering = subparser.add_mutually_exclusive_group()
+            fingering.add_argument("--guitar", action="store_true",
+                                   help="only voicings playable on a guitar "
+                                        "in standard tuning")
+            fingering.add_argument("--keyboard", action="store_true",
+                                   help="only voicings playable by two "
+                                        "hands")
+        if command == "scale":
+            # The scale and its keys form a single item.
+            subparser.set_defaults(join=True)
+    interactive = commands.add_parser("interactive",
+                                      help="the interactive flow, in "
+                                           "Portuguese")
+    interactive.set_defaults(handler=None)
+    args = parser.parse_args(argv)
+
+    if args.handler is None:
+        return _interactive(args)
+    if args.stages or args.profile is not None:
+        before = instrument.caches()
+        recorder = instrument.enable() if args.stages else None
+        if args.profile is not None:
+            path = None if args.profile == "-" else args.profile
+            with instrument.profile(path):
+                status = run(args)
+        else:
+            status = run(args)
+        if recorder is not None:
+            instrument.count_caches(before)
+            sys.stderr.write(recorder.report() + "\n")
+        return status
+
+    return run(args)
+
+
+def run(args):
+    """Runs a subcommand over its items, writing one record per item.
+
+    Writing the records is the "format" stage of 'instrument', and each
+    handler times its own stages.
+
+    Returns:
+        int: 0 if every item was handled, 1 otherwise.
+    """
+    if getattr(args, "join", False) and args.items:
+        args.items = [" ".join(args.items)]
+    writer = csv.writer(sys.stdout) if args.format == "csv" else None
+    status = 0
+    for item in items(args):
+        try:
+            record = args.handler(item, args)
+        except (ValueError, KeyError) as error:
+            record = {"input": item, "error": str(error)}
+            status = 1
+        with instrument.stage("format"):
+            if writer is None:
+                sys.stdout.write(json.dumps(record, ensure_ascii=False)
+                                 + "\n")
+            elif "error" in record:
+                writer.writerow([item, "error", record["error"]])
+            else:
+                writer.writerows(_rows(record))
+
+    if getattr(args, "key_cache", None) is not None:
+        args.key_cache.save()
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+"""Module to generate seeded corpora of chord progressions and note sets.
+
+Progressions are built the way songs usually are: a key is drawn, major or
+minor, then one of a few common patterns of degrees, each degree becoming the
+triad of the key on it, sometimes with a seventh, an extension or a
+suspension. Note sets are drawn from the same chords, or at random. The same
+seed always gives the same corpus, so benchmarks compare like with like.
+
+Every chord name uses the notes of 'base.notes' and the symbols 'chordparser'
+reads, so all of them can be decomposed.
+
+Imports:
+    random: draws the corpus from a seeded generator.
+    base: contains the chromatic scale.
+    chordparser: returns the notes of chord names.
+
+Vars:
+    major, minor (tuple): semitones from the tonic and triad of each degree
+        of the key.
+    patterns (tuple): common progressions, as indices of degrees.
+    sevenths (dict): the sevenths that may be added to each triad.
+    colours (tuple): extensions and suspensions added to some chords.
+
+Functions:
+    progression(): returns one progression, from a random generator.
+    labelled_progression(): returns one progression and its key.
+    progressions(): yields progressions as lists of chord names.
+    labelled_progressions(): yields progressions with their keys.
+    chord_names(): yields chord names, those of 'progressions' in a row.
+    charts(): yields progressions as lines of a chart.
+    note_sets(): yields the notes of chords, the root first.
+    progression_notes(): yields the distinct notes of each progression.
+"""
+import random
+
+import base
+import chordparser
+
+major = ((0, ""), (2, "m"), (4, "m"), (5, ""), (7, ""), (9, "m"),
+         (11, "m(b5)"))
+minor = ((0, "m"), (2, "m(b5)"), (3, ""), (5, "m"), (7, ""), (8, ""),
+         (10, ""))
+patterns = ((0, 3, 4, 0), (1, 4, 0), (0, 5, 3, 4), (0, 5, 1, 4),
+            (0, 3, 0, 4), (5, 3, 0, 4), (0, 4, 5, 3), (1, 4, 0, 5),
+            (0, 2, 3, 4), (0, 1, 2, 3, 4, 5, 6, 0))
+sevenths = {"": ("7M", "7"), "m": ("7",), "m(b5)": ("7",)}
+colours = ("(9)", "(b9)", "(13)", "(11)", "sus4", "add9", "6")
+
+
+def progression(generator):
+    """Returns a progression in a random key, as a list of chord names.
+
+    Args:
+        generator (random.Random): source of the random choices.
+    """
+    return labelled_progression(generator)[2]
+
+
+def labelled_progression(generator):
+    """Returns a progression in a random key, along with that key.
+
+    Args:
+        generator (random.Random): source of the random choices.
+
+    Returns:
+        tuple: the tonic's pitch class, the scale ("M" or "m") and the list
+            of chord names.
+    """
+    tonic = generator.randrange(12)
+    degrees = generator.choice((major, minor))
+    chords = []
+    for index in generator.choice(patterns):
+        semitones, triad = degrees[index]
+        name = base.notes[(tonic + semitones) % 12] + triad
+        draw = generator.random()
+        if draw < 0.4:
+            name += generator.choice(sevenths[triad])
+            if draw < 0.1:
+                name += generator.choice(colours[:4])
+        elif draw > 0.9 and not triad:
+            name += generator.choice(colours[4:])
+        chords.append(name)
+
+    return tonic, "M" if degrees is major else "m", chords
+
+
+def progressions(count, seed=0):
+    """Yields 'count' progressions, as lists of chord names.
+
+    Args:
+        count (int): number of progressions.
+        seed (int): seed of the random generator.
+    """
+    generator = random.Random(seed)
+    for _ in range(count):
+        yield progression(generator)
+
+
+def labelled_progressions(count, seed=0):
+    """Yields 'count' progressions with their keys.
+
+    The progressions are those of 'progressions' with the same seed.
+
+    Yields:
+        tuple: the tonic's pitch class, the scale ("M" or "m") and the list
+            of chord names.
+    """
+    generator = random.Random(seed)
+    for _ in range(count):
+        yield labelled_progression(generator)
+
+
+def chord_names(count, seed=0):
+    """Yields 'count' chord names, those of 'progressions' one after another.
+    """
+    generator = random.Random(seed)
+    while count > 0:
+        for name in progression(generator)[:count]:
+            yield name
+            count -= 1
+
+
+def charts(count, seed=0):
+    """Yields 'count' progressions as lines of a chart, with bar lines."""
+    for chords in progressions(count, seed):
+        yield " | ".join(chords)
+
+
+def note_sets(count, seed=0, shuffled=0.25):
+    """Yields the notes of 'count' chords, the root first.
+
+    Most sets are the notes of the chords of 'chord_names'. A share of them
+    are drawn at random instead, from 2 to 6 notes, so the sets that no
+    common chord has are also met.
+
+    Args:
+        count (int): number of note sets.
+        seed (int): seed of the random generator.
+        shuffled (float): share of sets drawn at random.
+    """
+    generator = random.Random(seed)
+    for name in chord_names(count, seed):
+        if generator.random() < shuffled:
+            size = generator.randint(2, 6)
+            yield [base.notes[pitch]
+                   for pitch in generator.sample(range(12), size)]
+        else:
+            yield chordparser.chord_notes(name)
+
+
+def progression_notes(count, seed=0):
+    """Yields the distinct notes of each of 'count' progressions, in order.
+    """
+    for chords in progressions(count, seed):
+        notes = []
+        for name in chords:
+            notes.extend(note for note in chordparser.chord_notes(name)
+                         if note not in notes)
+        yield notes
@@ -0,0 +1,126 @@
+"""Module to check how long each subcommand of 'cli' spends importing.
+
+Runs each subcommand in a fresh interpreter with 'python -X importtime' and
+adds up the cumulative time of the modules it imports, leaving out those a
+bare interpreter already imports at startup. Each subcommand has a budget in
+milliseconds and modules it must not import, such as NumPy for anything but
+'keyfind'. The best of a few runs is kept, to leave out noise.
+
+Run as a script, it prints one line per subcommand and exits with status 1
+if any goes over its budget or imports a forbidden module:
+    python importcheck.py [--runs N] [--scale FACTOR]
+
+Imports:
+    argparse, os, subprocess, sys: run the interpreters and read the output.
+
+Vars:
+    budgets (dict): pairs each subcommand with its arguments, its budget in
+        milliseconds and the modules it must not import.
+
+Functions:
+    imports(): returns the modules imported by a command and their times.
+    measure(): returns the import time and modules of a cli subcommand.
+    main(): checks every subcommand against its budget.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+budgets = {"decompose": (["decompose", "Dm7(b9)"], 40, ("numpy",)),
+           "identify": (["identify", "C E G Bb"], 50, ("numpy",)),
+           "scale": (["scale", "M", "D"], 40, ("numpy",)),
+           "scales": (["scales", "C E F# A"], 40, ("numpy",)),
+           "voice": (["voice", "G7"], 40, ("numpy",)),
+           "keyfind": (["keyfind", "C F G7 C"], 250, ())}
+
+_here = os.path.dirname(os.path.abspath(__file__))
+
+
+def imports(arguments):
+    """Returns the modules imported at top level by a command and times.
+
+    Args:
+        arguments (list): arguments of the interpreter after '-X importtime'.
+
+    Returns:
+        times (dict): pairs each module imported by the command itself, not
+            by another module, with its cumulative import time in
+            microseconds.
+        modules (set): every module imported, nested or not.
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime"] + arguments,
+                            cwd=_here, stdin=subprocess.DEVNULL,
+                            stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE, text=True, check=True)
+    times = {}
+    modules = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules.add(name.strip())
+        # Nested imports are indented by two more spaces per level.
+        if not name.startswith("  "):
+            times[name.strip()] = int(cumulative)
+
+    return times, modules
+
+
+def measure(arguments, runs=3, startup=None):
+    """Returns the import time and the modules of a cli subcommand.
+
+    Args:
+        arguments (list): arguments of 'cli.py'.
+        runs (int): number of runs, the fastest is kept.
+        startup (set): modules imported by a bare interpreter, left out.
+
+    Returns:
+        tuple: time in milliseconds and set of every module imported.
+    """
+    if startup is None:
+        startup = imports(["-c", "pass"])[1]
+    best = None
+    modules = set()
+    for _ in range(runs):
+        times, loaded = imports(["cli.py"] + arguments)
+        total = sum(time for name, time in times.items()
+                    if name not in startup)
+        best = total if best is None else min(best, total)
+        modules.update(loaded)
+
+    return best / 1000, modules
+
+
+def main(argv=None):
+    """Checks the import time of every subcommand against its budget.
+
+    Returns:
+        int: 0 if every subcommand is within its budget, 1 otherwise.
+    """
+    parser = argparse.ArgumentParser(
+        description="Check the import time of each cli subcommand.")
+    parser.add_argument("--runs", type=int, default=3,
+                        help="runs per subcommand, the fastest is kept")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="multiply every budget, for slower machines")
+    args = parser.parse_args(argv)
+
+    startup = imports(["-c", "pass"])[1]
+    status = 0
+    for command, (arguments, budget, forbidden) in budgets.items():
+        milliseconds, loaded = measure(arguments, args.runs, startup)
+        found = [name for name in forbidden if name in loaded]
+        budget *= args.scale
+        ok = milliseconds <= budget and not found
+        print("{:<10} {:7.1f} ms  budget {:6.1f} ms  {}{}".format(
+            command, milliseconds, budget, "ok" if ok else "FAIL",
+            "  imports " + ", ".join(found) if found else ""))
+        if not ok:
+            status = 1
+
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
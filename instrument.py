@@ -0,0 +1,228 @@
+"""Module to time the stages of key finding and count what they go through.
+
+Instrumentation is off by default. While it is, 'stage' returns a single
+shared context that does nothing and 'count' returns at once, so the
+instrumented code pays one call per stage, never per chord, and builds no
+measure at all. Once enabled, each stage's time and each count is sent to
+every sink: any object with the methods of 'Sink', such as a 'Recorder',
+which keeps totals and formats them as a report, or one forwarding them to
+another metrics system.
+
+The caches of 'chordparser' and of the Scale class count their hits and
+misses whether or not this is enabled; 'caches' reads both, and 'count_caches'
+sends what changed since an earlier reading to the sinks.
+
+'profile' runs a block under cProfile and writes its pstats report, or dumps
+the raw statistics to a file.
+
+Imports:
+    contextlib, sys, time: provide the contexts, the output and the clock.
+    baseclasses: contains the Scale class and its cache.
+    chordparser: contains the parse cache.
+
+Vars:
+    enabled (bool): if true, stages are timed and counts sent to the sinks.
+    sinks (list): objects receiving every measure.
+
+Classes:
+    Sink: Base class of the sinks, ignoring every measure.
+    Recorder: Sink keeping the totals of every stage and count.
+
+Functions:
+    enable(): turns instrumentation on with some sinks.
+    disable(): turns instrumentation off and removes the sinks.
+    stage(): returns a context timing a stage.
+    count(): adds a value to a counter.
+    caches(): returns the hits and misses of the parse and scale caches.
+    count_caches(): counts the cache hits and misses since a reading.
+    profile(): runs a block under cProfile and reports on it.
+"""
+import contextlib
+import sys
+import time
+
+import baseclasses
+import chordparser
+
+enabled = False
+sinks = []
+
+
+class Sink:
+    """Base class of the objects receiving the measures.
+
+    Methods:
+        timing: Receives the seconds taken by one run of a stage.
+        count: Receives a value added to a counter.
+    """
+
+    def timing(self, stage, seconds):
+        """Receives the seconds taken by one run of a stage."""
+
+    def count(self, name, value):
+        """Receives a value added to a counter."""
+
+
+class Recorder(Sink):
+    """Sink keeping the totals of every stage and counter.
+
+    Attributes:
+        timings (dict): Pairs each stage with its number of runs and its
+            total seconds, in the order the stages first ran.
+        counts (dict): Pairs each counter with its total.
+
+    Methods:
+        report: Formats the totals as a table.
+        reset: Empties the totals.
+    """
+
+    def __init__(self):
+        """Starts with no totals."""
+        self.timings = {}
+        self.counts = {}
+
+    def timing(self, stage, seconds):
+        """Adds one run of a stage and its seconds to the totals."""
+        totals = self.timings.setdefault(stage, [0, 0.0])
+        totals[0] += 1
+        totals[1] += seconds
+
+    def count(self, name, value):
+        """Adds a value to a counter's total."""
+        self.counts[name] = self.counts.get(name, 0) + value
+
+    def reset(self):
+        """Empties the totals."""
+        self.timings.clear()
+        self.counts.clear()
+
+    def report(self):
+        """Formats the stages, their share of the time, and the counters.
+
+        The hit rate of a cache is added after its hits and misses.
+        """
+        total = sum(seconds for _, seconds in self.timings.values())
+        lines = ["{:<12}{:>8}{:>12}{:>12}{:>8}".format(
+            "stage", "runs", "total ms", "mean ms", "share")]
+        for stage, (runs, seconds) in self.timings.items():
+            lines.append("{:<12}{:>8}{:>12.3f}{:>12.4f}{:>8.1%}".format(
+                stage, runs, seconds * 1000, seconds * 1000 / runs,
+                seconds / total if total else 0))
+        for name, value in self.counts.items():
+            lines.append("{:<24}{:>12}".format(name, value))
+            if name.endswith(".misses"):
+                cache = name[:-len(".misses")]
+                hits = self.counts.get(cache + ".hits", 0)
+                if hits + value:
+                    lines.append("{:<24}{:>12.1%}".format(
+                        cache + ".rate", hits / (hits + value)))
+        return "\n".join(lines)
+
+
+class _Stage:
+    """Context timing one run of a stage and sending it to the sinks."""
+
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exception):
+        seconds = time.perf_counter() - self.start
+        for sink in sinks:
+            sink.timing(self.name, seconds)
+
+
+_idle = contextlib.nullcontext()
+
+
+def enable(*new_sinks):
+    """Turns instrumentation on, sending the measures to the sinks given.
+
+    Returns:
+        Sink: the first sink, a new Recorder if none was given.
+    """
+    global enabled
+    sinks[:] = new_sinks or [Recorder()]
+    enabled = True
+    return sinks[0]
+
+
+def disable():
+    """Turns instrumentation off and removes the sinks."""
+    global enabled
+    enabled = False
+    sinks.clear()
+
+
+def stage(name):
+    """Returns a context timing a stage, or doing nothing if disabled.
+
+    Used as 'with instrument.stage("compare"): ...'.
+    """
+    if not enabled:
+        return _idle
+    return _Stage(name)
+
+
+def count(name, value=1):
+    """Adds a value to a counter, if enabled."""
+    if enabled:
+        for sink in sinks:
+            sink.count(name, value)
+
+
+def caches():
+    """Returns the hits and misses of the parse and scale caches.
+
+    Returns:
+        dict: pairs "parse" and "scale" with tuples of (hits, misses).
+    """
+    parse = chordparser.cache_info()
+    scale = baseclasses.Scale.cache_info()
+    return {"parse": (parse.hits, parse.misses), "scale": scale[:2]}
+
+
+def count_caches(before):
+    """Counts the hits and misses of each cache since a reading of 'caches'.
+
+    The counters are named after the cache, such as "parse.hits".
+    """
+    for cache, (hits, misses) in caches().items():
+        count(cache + ".hits", hits - before[cache][0])
+        count(cache + ".misses", misses - before[cache][1])
+
+
+@contextlib.contextmanager
+def profile(path=None, sort="cumulative", limit=25, stream=None):
+    """Runs a block under cProfile and reports on it when it ends.
+
+    Args:
+        path (str): file where the raw statistics are dumped, to be read by
+            'pstats'. If None, a report is written instead.
+        sort (str): order of the report, a key of 'pstats.Stats.sort_stats'.
+        limit (int): number of functions in the report.
+        stream (file): where the report is written, stderr by default.
+
+    Yields:
+        cProfile.Profile: the running profiler.
+    """
+    # Imported here so that runs without profiling don't load them.
+    import cProfile
+    import pstats
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        if path:
+            profiler.dump_stats(path)
+        else:
+            stats = pstats.Stats(profiler, stream=stream or sys.stderr)
+            stats.sort_stats(sort).print_stats(limit)
@@ -0,0 +1,399 @@
+"""Module to cache the keys of progressions whatever key they are played in.
+
+A progression and its transpositions have the same keys, transposed: the
+cache so stores the ranking of a single transposition of each progression,
+its canonical one, and shifts it back to the key of each progression asked
+for. The canonical transposition is the one with the lowest sequence of
+pitch-class masks, so the first chord's mask is rotated to its lowest value
+first and the next chords only break ties, for chords whose mask repeats
+under rotation.
+
+What is stored for a progression is the score of every key, in its
+canonical transposition, as 'keyscore' gives it: the percentage of every
+scale on every key or, in the weighted mode, the confidence of the 24 major
+and minor keys. A hit only rotates these scores and sorts them again, the
+ties in the order 'keyscore' keeps, so the keys returned, and their order,
+are the ones 'keyscore' returns for the progression itself, but for keys
+of equal confidence in the weighted mode, which always come in the order of
+the keys here. Misses are scored together, with a single call to
+'keyscore'.
+
+The least recently used progressions are dropped past the size limit, and
+the cache can be written to a JSON file and read back, so a warm cache
+survives a restart. Entries scored against other scales than those stored
+in the Scale class are dropped, when these change or when a file is read.
+
+Imports:
+    collections, functools, json, os: hold the entries in order, keep the
+        masks of chord names and write the entries.
+    numpy: scores the progressions the cache misses.
+    base: contains the chromatic scale and pitch-class functions.
+    baseclasses: contains the Scale class whose scales are ranked.
+    chordparser: returns the masks of chord names.
+    instrument: times the stages of 'rank_many' and counts the hits and
+        misses of the cache.
+    keyscore: scores the progressions the cache misses.
+
+Vars:
+    MAXSIZE (int): default number of progressions kept.
+
+Classes:
+    CacheInfo: Hits, misses, limit, size and evictions of a cache.
+    KeyCache: Transposition-invariant cache of the keys of progressions.
+
+Functions:
+    canonical(): returns the canonical transposition of a progression.
+"""
+import collections
+import functools
+import json
+import os
+
+import numpy as np
+
+import base
+import baseclasses
+import chordparser
+import instrument
+import keyscore
+
+MAXSIZE = 4096
+
+# The masks of chord names, which 'chordparser' works out on every call.
+_mask = functools.lru_cache(maxsize=chordparser.CACHE_SIZE)(
+    chordparser.chord_mask)
+
+# For each mask, the shifts down rotating it to its lowest value.
+_lowest = []
+
+
+class CacheInfo(collections.namedtuple(
+        "CacheInfo", "hits misses maxsize currsize evictions")):
+    """Hits, misses, limit, size and evictions of a cache.
+
+    Attributes:
+        hits, misses: Progressions found in the cache, and scored.
+        maxsize: Most progressions kept, None for no limit.
+        currsize: Progressions kept.
+        evictions: Progressions dropped to keep to the limit.
+        hit_rate: Share of the progressions found, 0 if none was asked for.
+    """
+
+    __slots__ = ()
+
+    @property
+    def hit_rate(self):
+        asked = self.hits + self.misses
+        return self.hits / asked if asked else 0.0
+
+
+def _shifts(mask):
+    """Returns the shifts down rotating a mask to its lowest value."""
+    if not _lowest:
+        for value in range(4096):
+            rotations = [base.rotate(value, -shift) for shift in range(12)]
+            least = min(rotations)
+            _lowest.append(tuple(shift for shift, rotated
+                                 in enumerate(rotations)
+                                 if rotated == least))
+    return _lowest[mask]
+
+
+def canonical(progression):
+    """Returns the canonical transposition of a progression.
+
+    Args:
+        progression (tuple): pitch-class mask of each chord, or pairs of a
+            mask and a weight, which are kept as they are.
+
+    Returns:
+        shift (int): semitones the canonical transposition is to be
+            transposed up by to give back the progression.
+        canonical (tuple): the progression transposed down by 'shift'.
+    """
+    if not progression:
+        return 0, ()
+    weighted = isinstance(progression[0], tuple)
+    first = progression[0][0] if weighted else progression[0]
+    best = None
+    for shift in _shifts(first):
+        if weighted:
+            rotated = tuple((base.rotate(mask, -shift), weight)
+                            for mask, weight in progression)
+        else:
+            rotated = tuple(base.rotate(mask, -shift)
+                            for mask in progression)
+        if best is None or rotated < best[1]:
+            best = (shift, rotated)
+    return best
+
+
+def _weights(items):
+    """Returns the masks and weights of chord names, each one optionally
+    followed by ":duration", as 'keyscore.histogram' reads them.
+
+    Raises:
+        ValueError: if a chord name or a duration can't be read.
+    """
+    pairs = []
+    for item in items:
+        name, _, duration = item.partition(":")
+        weight = keyscore.read_duration(duration) if duration else 1.0
+        pairs.append((_mask(name), weight))
+    return tuple(pairs)
+
+
+class KeyCache:
+    """Transposition-invariant cache of the keys of progressions.
+
+    Not safe to share between threads without a lock.
+
+    Attributes:
+        maxsize (int): Most progressions kept, None for no limit.
+        path (str): JSON file the cache is read from and written to, if any.
+        hits, misses, evictions (int): Counters of 'cache_info'.
+
+    Methods:
+        rank: Returns the most probable keys of chord names.
+        rank_weighted: The same, weighing the chords by their length.
+        rank_many: Returns the keys of many progressions at once.
+        cache_info: Returns the hits, misses, limit, size and evictions.
+        clear: Drops every progression and zeroes the counters.
+        save: Writes the cache to a JSON file.
+        load: Reads progressions from a JSON file written by 'save'.
+    """
+
+    def __init__(self, maxsize=MAXSIZE, path=None):
+        """Sets up an empty cache, reading 'path' if the file exists."""
+        self.maxsize = maxsize
+        self.path = path
+        self._entries = collections.OrderedDict()
+        self._scales = None
+        self._version = None
+        self.hits = self.misses = self.evictions = 0
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    def _check_scales(self):
+        """Drops the percentages scored against scales no longer stored.
+
+        The scales are only compared when the version of the Scale class
+        changes.
+        """
+        keyscore.templates()
+        if self._version != baseclasses.Scale.version:
+            scales = tuple(baseclasses.Scale.name_mask.items())
+            if scales != self._scales:
+                for key in [key for key in self._entries
+                            if key[0] is None]:
+                    del self._entries[key]
+                self._scales = scales
+            self._version = baseclasses.Scale.version
+
+    def _store(self, key, entry):
+        """Adds a progression, dropping the least recently used past the
+        limit."""
+        self._entries[key] = entry
+        if self.maxsize is not None:
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    @staticmethod
+    def _score(progressions, sharpness):
+        """Scores canonical progressions with a single call to 'keyscore'.
+
+        Args:
+            progressions (list): canonical masks of each progression, or
+                pairs of a mask and a weight in the weighted mode.
+            sharpness (float): see 'keyscore.confidences', None for the
+                percentages of every scale.
+
+        Returns:
+            list: tuple of the scores of every key of each progression, the
+                keys in the order of 'keyscore'.
+        """
+        if sharpness is None:
+            vectors = np.zeros((len(progressions), 12))
+            for row, progression in zip(vectors, progressions):
+                mask = 0
+                for chord in progression:
+                    mask |= chord
+                row[:] = keyscore.mask_vector(mask)
+            _, _, lengths = keyscore.templates()
+            scores = keyscore.score(vectors) / lengths[:, None]
+        else:
+            histograms = np.zeros((len(progressions), 12))
+            for row, progression in zip(histograms, progressions):
+                for mask, weight in progression:
+                    for pitch in base.mask_pitches(mask):
+                        row[pitch] += weight
+            # Rounded so that confidences equal but for rounding errors,
+            # which differ from a transposition to another, tie.
+            scores = np.round(keyscore.confidences(
+                keyscore.correlate(histograms), sharpness), 12)
+        return [tuple(row) for row in
+                scores.reshape(len(progressions), -1).tolist()]
+
+    @staticmethod
+    def _entry(row):
+        """Returns the scores of a progression with the keys sorted by them,
+        as they are kept."""
+        return row, tuple(sorted(range(len(row)), key=row.__getitem__,
+                                 reverse=True))
+
+    @staticmethod
+    def _output(entry, shift, top, sharpness):
+        """Shifts the ranking of a canonical progression back to its key.
+
+        Only the keys scoring at least as much as the last one returned are
+        sorted again, after their keys are shifted: ties keep the order of
+        the scales, then that of the keys, as in 'keyscore'.
+        """
+        row, order = entry
+        end = min(top, len(order))
+        if shift and end:
+            least = row[order[end - 1]]
+            while end < len(order) and row[order[end]] == least:
+                end += 1
+        found = [(row[index], index - index % 12 + (index + shift) % 12)
+                 for index in order[:end]]
+        if shift:
+            found.sort(key=lambda pair: (-pair[0], pair[1]))
+        found = found[:top]
+        if sharpness is None:
+            names, _, _ = keyscore.templates()
+            return [(base.notes[index % 12], names[index // 12],
+                     min(max(round(score * 100), 0), 100))
+                    for score, index in found]
+        keys, _ = keyscore.profiles()
+        return [keys[index] + (round(score, 4),) for score, index in found]
+
+    def rank_many(self, progressions, top=3, weighted=False,
+                  sharpness=keyscore.SHARPNESS):
+        """Returns the most probable keys of many progressions at once.
+
+        The progressions the cache misses are scored together, then kept;
+        reading the chords is the "decompose" stage of 'instrument' and
+        scoring them the "compare" stage.
+
+        Args:
+            progressions (iterable): lists of chord names, each followed by
+                ":duration" if weighted. i.e: ["C:2", "G7:1", "C"]
+            top (int): number of keys returned per progression.
+            weighted (bool): if true, ranks as 'keyscore.rank_weighted'
+                does, else as 'keyscore.rank_chords'.
+            sharpness (float): see 'keyscore.confidences'.
+
+        Returns:
+            list: one list of (tonic, scale, percentage or confidence)
+                tuples per progression, the most probable first.
+
+        Raises:
+            ValueError: if a chord name or a duration can't be read.
+        """
+        sharpness = float(sharpness) if weighted else None
+        if not weighted:
+            self._check_scales()
+        found = []
+        missed = {}
+        with instrument.stage("decompose"):
+            for progression in progressions:
+                if weighted:
+                    progression = _weights(progression)
+                else:
+                    progression = tuple(map(_mask, progression))
+                shift, key = canonical(progression)
+                key = (sharpness, key)
+                found.append((shift, key))
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                elif key in missed:
+                    self.hits += 1
+                else:
+                    missed[key] = None
+                    self.misses += 1
+        if missed:
+            with instrument.stage("compare"):
+                rows = self._score([key[1] for key in missed], sharpness)
+            missed = dict(zip(missed, map(self._entry, rows)))
+        instrument.count("keycache.hits", len(found) - len(missed))
+        instrument.count("keycache.misses", len(missed))
+
+        output = []
+        for shift, key in found:
+            entry = self._entries.get(key) or missed[key]
+            output.append(self._output(entry, shift, top, sharpness))
+        for key, entry in missed.items():
+            self._store(key, entry)
+        return output
+
+    def rank(self, chord_names, top=3):
+        """Returns the most probable keys of chord names, as
+        'keyscore.rank_chords' does."""
+        return self.rank_many([chord_names], top)[0]
+
+    def rank_weighted(self, items, top=3, sharpness=keyscore.SHARPNESS):
+        """Returns the most probable keys of chords weighted by their length,
+        as 'keyscore.rank_weighted' does."""
+        return self.rank_many([items], top, True, sharpness)[0]
+
+    def cache_info(self):
+        """Returns the hits, misses, limit, size and evictions of the cache.
+        """
+        return CacheInfo(self.hits, self.misses, self.maxsize,
+                         len(self._entries), self.evictions)
+
+    def clear(self):
+        """Drops every progression and zeroes the counters."""
+        self._entries.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def save(self, path=None):
+        """Writes the cache to a JSON file, the least recently used first.
+
+        The file is written next to its final path, then moved there, so
+        that a cache being written is never read half-way.
+
+        Args:
+            path (str): path of the file, 'path' of the cache if None.
+        """
+        path = path or self.path
+        self._check_scales()
+        data = {"scales": [list(scale) for scale in self._scales],
+                "entries": [[sharpness, progression, row]
+                            for (sharpness, progression), (row, _)
+                            in self._entries.items()]}
+        temporary = path + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump(data, file)
+        os.replace(temporary, path)
+
+    def load(self, path):
+        """Reads progressions from a JSON file written by 'save'.
+
+        They count as the most recently used, and the percentages scored
+        against other scales than those stored are left out.
+
+        Raises:
+            ValueError: if the file doesn't hold a cache.
+        """
+        with open(path, encoding="utf-8") as file:
+            try:
+                data = json.load(file)
+                scales = tuple((name, mask) for name, mask in data["scales"])
+                entries = data["entries"]
+            except (ValueError, KeyError, TypeError):
+                raise ValueError("{} does not hold a key cache".format(
+                    path)) from None
+        self._check_scales()
+        for sharpness, progression, row in entries:
+            if sharpness is None:
+                if scales != self._scales:
+                    continue
+                key = (None, tuple(progression))
+            else:
+                key = (sharpness, tuple(map(tuple, progression)))
+            self._entries.pop(key, None)
+            self._store(key, self._entry(tuple(row)))
@@ -6,7 +6,11 @@ documentation for further detail), then interfaces them with the user in a
 single function to perform the input and output.
 
 Imports:
+    base: contains the chromatic scale and pitch-class functions.
     baseclasses: contains the necessary Chord class and other functions
+    chordparser: parses chord names, ahead of decomposition when the stages
+                 are timed.
+    instrument: times the stages of 'find' and counts what they go through.
 
 Functions:
     chords_input(): takes user input and turns in objects of the Chord class
@@ -15,6 +19,8 @@ Functions:
     compare(): takes notes in a list and compares them against notes of a scale
                in all keys to find the most probable one. If the optional
                argument is true, returns in percentage the most probable ones.
+    find(): decomposes Chord objects and compares their notes with a scale,
+            timing each stage when 'instrument' is enabled.
     matchformat(): uses a list of the matches with notes and percentages to
                    format it and print to the user.
     keyfind(): the titular function combines all the previous functions to
@@ -22,7 +28,10 @@ Functions:
 """
 
 
+import base
 import baseclasses
+import chordparser
+import instrument
 
 
 def chords_input():
@@ -38,10 +47,13 @@ def chords_input():
 def input_decompose(chords: list):
     """Takes a list of Chord objects and returns their notes in a list."""
     output = []
+    seen = 0
     for chord in chords:
         chord.decompose()
         for note in chord.notes:
-            if note not in output:
+            bit = 1 << base.pitch_class(note)
+            if not seen & bit:
+                seen |= bit
                 output.append(note)
 
     return output
@@ -65,9 +77,11 @@ def matchpercentage_calc(scalenotes: list, matches: dict):
 def compare(chord_notes, scale_keys, percentage=False):
     """Compares the notes of chords with keys's notes on a given scale.
 
-    Iterates the scale, for each key setting the tonic in the dictionaries to
-    be returned then comparing its notes with the chords' notes and updating
-    the returns. In the percentage part, .
+    Turns the chords' notes into a pitch-class mask, then iterates the scale,
+    for each key setting the tonic in the dictionaries to be returned and
+    counting, with the key's own mask, the notes shared with the chords minus
+    the chords' notes outside the key. In the percentage part, these counts
+    are turned into percentages of the length of the scale.
 
     Args:
         chord_notes (list): notes of the chords to be compared.
@@ -78,37 +92,27 @@ def compare(chord_notes, scale_keys, percentage=False):
 
     Vars:
         scale_values (list): list containing only the notes of scale_keys.
-        i (int): counter
+        chord_mask (int): pitch-class mask of the chords' notes.
 
     Returns:
         matches (dict): keys and number of matches per key.
         results (dict): keys and notes shared between each of them and chords.
     """
     scale_values = list(scale_keys.values())
+    chord_mask = base.notes_mask(chord_notes)
     matches = {}
     results = {}
-    i = 0
-
-    for key in scale_values:
-        tonic = key[0]
-        matches[tonic] = i
-        results[tonic] = []
-        i += 1
-        for note in key:
-            for chord_note in chord_notes:
-                if note == chord_note:
-                    matches[tonic] = i
-                    results[tonic].append(note)
-                    i += 1
-        i = 0
 
     # For each note that isn't a match, probability of the key being correct
     # decreases.
-    for note in chord_notes:
-        for key in scale_values:
-            tonic = key[0]
-            if note not in key:
-                matches[tonic] -= 1
+    for key in scale_values:
+        tonic = key[0]
+        key_mask = base.notes_mask(key)
+        shared = chord_mask & key_mask
+        matches[tonic] = (base.popcount(shared)
+                          - base.popcount(chord_mask & ~key_mask))
+        results[tonic] = [note for note in key
+                          if shared >> base.pitch_class(note) & 1]
 
     if percentage:
         return matchpercentage_calc(scale_values, matches)
@@ -116,6 +120,43 @@ def compare(chord_notes, scale_keys, percentage=False):
         return results
 
 
+def find(chords: list, scalename="M", percentage=True):
+    """Finds the most probable keys of Chord objects on a scale.
+
+    Runs the stages of the key finder one after the other: parsing the
+    chords' names, decomposing them, applying the scale and comparing. When
+    'instrument' is enabled, each stage is timed, the names are parsed on
+    their own so that parsing is told apart from decomposing, and the
+    number of chords and notes and the hits and misses of the caches are
+    counted. Otherwise nothing more is done than the stages themselves.
+
+    Args:
+        chords (list): Chord objects, as returned by 'chords_input'.
+        scalename (str): name of a scale stored in the Scale class.
+        percentage (bool): passed on to 'compare'.
+
+    Returns:
+        dict: the return of 'compare'.
+    """
+    if instrument.enabled:
+        before = instrument.caches()
+        with instrument.stage("parse"):
+            for chord in chords:
+                chordparser.parse(chord.name)
+    with instrument.stage("decompose"):
+        notes = input_decompose(chords)
+    with instrument.stage("scale"):
+        scale_keys = baseclasses.Scale.apply(scalename)
+    with instrument.stage("compare"):
+        matches = compare(notes, scale_keys, percentage)
+
+    if instrument.enabled:
+        instrument.count("chords", len(chords))
+        instrument.count("notes", len(notes))
+        instrument.count_caches(before)
+    return matches
+
+
 def matchformat(matches: dict):
     """Formats the return of the compare() function to present it to the user.
 
@@ -151,10 +192,9 @@ def matchformat(matches: dict):
 def keyfind():
     """Declares major scale and executes whole script."""
     baseclasses.Scale("M", "I II III IV V VI VII")
-    major_tones = baseclasses.Scale.apply("M")
 
     chords = chords_input()
-    notes = input_decompose(chords)
-    matches = compare(notes, major_tones, True)
-    matchformat(matches)
+    matches = find(chords, "M")
+    with instrument.stage("format"):
+        matchformat(matches)
     return
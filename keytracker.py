@@ -0,0 +1,168 @@
+"""Module to follow the key of a piece chord by chord, detecting modulations.
+
+Keeps a window of the last chords and, for every key of every scale, the
+score 'keyfinder' gives to the notes in the window (notes shared with the key
+minus notes outside of it). When a chord enters or leaves the window, only
+the pitch classes that appear in or disappear from it change the scores, each
+by one column of the 'keyscore' templates, so each step costs the same
+whatever the size of the window.
+
+Imports:
+    collections: has the deque holding the window.
+    numpy: holds the scores of every key.
+    base: contains the chromatic scale and pitch-class functions.
+    chordparser: returns the pitch-class mask of chord names.
+    keyscore: has the template of every scale on every key.
+
+Classes:
+    KeyTracker: Keeps the window and the scores and returns the best key.
+
+Functions:
+    track(): yields the best key and its confidence after each chord.
+    segments(): groups the output of 'track' into stretches in one key.
+"""
+import collections
+
+import numpy as np
+
+import base
+import chordparser
+import keyscore
+
+
+class KeyTracker:
+    """Class to follow the most probable key over a window of chords.
+
+    Attributes:
+        window (deque): Pitch-class masks of the chords in the window.
+        size (int): Maximum number of chords in the window.
+        keys (list): Pairs of tonic and scale name, one per score.
+        columns (ndarray): For each pitch class, its template value on each
+            key.
+        counts (ndarray): Number of chords in the window with each pitch
+            class.
+        scores (ndarray): Score of each key for the notes in the window.
+        position (int): Number of chords pushed so far.
+        best (int): Index in 'keys' of the current best key.
+
+    Methods:
+        push: Adds a chord to the window and returns the best key.
+    """
+
+    def __init__(self, size=8, scales=None):
+        """Prepares an empty window and the templates of the scales.
+
+        Args:
+            size (int): Number of chords in the window.
+            scales (list): Names of the scales followed, all of those in the
+                Scale class if None.
+
+        Raises:
+            ValueError: if the window holds no chord.
+        """
+        if size < 1:
+            raise ValueError("the window must hold at least one chord, not "
+                             "{}".format(size))
+        names, tensor, _ = keyscore.templates()
+        rows = [names.index(name) for name in scales or names]
+        self.columns = tensor[rows].reshape(-1, 12).T.copy()
+        self.keys = [(tonic, names[row]) for row in rows
+                     for tonic in base.notes]
+        self.size = size
+        self.window = collections.deque()
+        self.counts = np.zeros(12, dtype=int)
+        self.scores = np.zeros(len(self.keys))
+        self.position = 0
+        self.best = 0
+
+    def _add(self, mask, step):
+        """Adds (step 1) or removes (step -1) a chord's notes from the window.
+
+        Only the pitch classes whose presence changes move the scores.
+        """
+        for pitch in base.mask_pitches(mask):
+            before = self.counts[pitch]
+            self.counts[pitch] += step
+            if not before or not self.counts[pitch]:
+                self.scores += step * self.columns[pitch]
+
+    def push(self, chord):
+        """Adds a chord to the window, dropping the oldest one if full.
+
+        The previous best key is kept while no other key scores higher, so
+        keys that tie do not alternate from one chord to the next.
+
+        Args:
+            chord (str or int): chord name or pitch-class mask.
+
+        Returns:
+            tuple: the position of the chord, the best (tonic, scale) and its
+                confidence, the share of the window's notes inside that key.
+        """
+        mask = chord if isinstance(chord, int) else (
+            chordparser.chord_mask(chord))
+        if len(self.window) == self.size:
+            self._add(self.window.popleft(), -1)
+        self.window.append(mask)
+        self._add(mask, 1)
+
+        top = self.scores.max()
+        if self.scores[self.best] < top:
+            self.best = int(self.scores.argmax())
+        notes = np.count_nonzero(self.counts)
+        confidence = (top + notes) / (2 * notes) if notes else 0.0
+
+        position = self.position
+        self.position += 1
+        return position, self.keys[self.best], float(confidence)
+
+
+def track(chords, size=8, scales=None):
+    """Yields the best key and its confidence after each chord.
+
+    Args:
+        chords (iterable): chord names or pitch-class masks.
+        size (int): number of chords in the window.
+        scales (list): names of the scales followed, all if None.
+
+    Yields:
+        tuple: (position, (tonic, scale), confidence)
+
+    Raises:
+        ValueError: if the window holds no chord.
+    """
+    tracker = KeyTracker(size, scales)
+    for chord in chords:
+        yield tracker.push(chord)
+
+
+def segments(series, min_length=1):
+    """Groups the output of 'track' into stretches in a single key.
+
+    Keys held for fewer than 'min_length' chords are merged into the
+    stretch before them, so short tonicizations are not counted as
+    modulations. As the window trails the chords, a change is found some
+    chords after it happens, at most the size of the window.
+
+    Args:
+        series (iterable): tuples of (position, key, confidence).
+        min_length (int): minimum number of chords of a stretch.
+
+    Returns:
+        list: tuples of (start, end, key), 'end' excluded, in order.
+    """
+    output = []
+    for position, key, _ in series:
+        if output and output[-1][2] == key:
+            output[-1][1] = position + 1
+        else:
+            output.append([position, position + 1, key])
+
+    merged = []
+    for start, end, key in output:
+        if merged and (end - start < min_length or merged[-1][2] == key):
+            merged[-1][1] = end
+        else:
+            merged.append([start, end, key])
+
+    return [tuple(stretch) for stretch in merged]
@@ -2,37 +2,43 @@
 """Module that begins the script by invoking the others and their functions.
 
 First, get their input of choice of function, then invokes the respective
-module of the script.
+module of the script, importing only that module. For non-interactive use,
+see the 'cli' module.
 """
-import chordcomposer
-import keyfinder
-import scalemaker
-
-introduction = ("\nOl! Bem-vindo ao programa multiuso para msicos!\n"
-                "Digite 'T' para tirar o tom de uma msica inserindo "
-                "seus acordes, 'A' para identificar ou decompr acordes "
-                "e 'E' para montar escalas.\n")
-print(introduction)
-
-
-selector1 = str(input("Insira:  "))
-if selector1 == "T":
-    print(("\nPara descobrir o tom da msica, insira os acordes "
-          "separados por espaos.\n"))
-    keyfinder.keyfind()
-
-elif selector1 == "A":
-    announcement = ("\nDigite 'D' para descobrir as notas de um acorde ou 'I' "
-                    "para identificar um acorde a partir de suas notas.\n")
-    print(announcement)
-
-    selector2 = str(input("Insira: "))
-    if selector2 == "D":
-        chordcomposer.run_decompose()
-    if selector2 == "I":
-        chordcomposer.run_compose()
-
-elif selector1 == "E":
-    scalemaker.scalemake()
-
-exit()
+
+
+def main():
+    """Gets the user's choice of function and invokes it."""
+    introduction = ("\nOl! Bem-vindo ao programa multiuso para msicos!\n"
+                    "Digite 'T' para tirar o tom de uma msica inserindo "
+                    "seus acordes, 'A' para identificar ou decompr acordes "
+                    "e 'E' para montar escalas.\n")
+    print(introduction)
+
+    selector1 = str(input("Insira:  "))
+    if selector1 == "T":
+        print(("\nPara descobrir o tom da msica, insira os acordes "
+              "separados por espaos.\n"))
+        import keyfinder
+        keyfinder.keyfind()
+
+    elif selector1 == "A":
+        announcement = ("\nDigite 'D' para descobrir as notas de um acorde "
+                        "ou 'I' para identificar um acorde a partir de suas "
+                        "notas.\n")
+        print(announcement)
+
+        selector2 = str(input("Insira: "))
+        import chordcomposer
+        if selector2 == "D":
+            chordcomposer.run_decompose()
+        if selector2 == "I":
+            chordcomposer.run_compose()
+
+    elif selector1 == "E":
+        import scalemaker
+        scalemaker.scalemake()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+"""Module to read Standard MIDI Files and find their keys and chords.
+
+The file is mapped into memory with 'mmap' and read through a memoryview:
+each track is a slice of it, so no track data is copied, and its events are
+decoded one at a time, with running status, into the notes they sound, each
+with its start and end in ticks. Notes on the drum channel (the 10th) are
+left out unless asked for.
+
+The notes are added up into 12-bin pitch-class histograms, one per window
+of a number of beats, each note weighing the beats it sounds in the window.
+These are the weighted histograms 'keyscore' ranks the 24 major and minor
+keys with, for the whole file or for each window, and the notes sounding
+the most in a window, the lowest first, are named by 'chordindex.nearest'.
+
+Files with a timecode division instead of ticks per beat count in seconds
+instead of beats.
+
+Run as a script over files or folders, writing one JSON line per file:
+    python midi.py [--window BEATS] [--top N] [--chords] [--drums]
+                   [--workers N] PATH ...
+
+Imports:
+    argparse, collections, json, mmap, sys: handle the command line, the
+        mapping of the files and the output.
+    base: contains the chromatic scale and pitch-class functions.
+    chordindex: names chords from their notes.
+    keyscore: ranks the keys of the histograms.
+    parallel: analyses many files, across processes if asked.
+    transpose: spells the chords in the key of the file.
+
+Classes:
+    Note: A note of a MIDI file, in ticks.
+    MidiFile: Standard MIDI File mapped into memory.
+
+Vars:
+    DRUMS (int): channel of the drums, counted from 0.
+    EXTENSIONS (tuple): endings of the MIDI files found in folders.
+
+Functions:
+    windows(): adds notes up into pitch-class histograms per window.
+    analyse(): returns the keys, and chords, of a MIDI file.
+    analyse_many(): analyses many MIDI files, across processes if asked.
+    main(): analyses MIDI files from the command line.
+"""
+import argparse
+import collections
+import json
+import mmap
+import sys
+
+import base
+import chordindex
+import keyscore
+import parallel
+import transpose
+
+DRUMS = 9
+EXTENSIONS = (".mid", ".midi", ".smf")
+
+
+class Note(collections.namedtuple("Note",
+                                  "start end pitch velocity channel")):
+    """A note of a MIDI file.
+
+    Attributes:
+        start, end: Ticks at which the note starts and stops sounding.
+        pitch: MIDI note number, 60 being the middle C.
+        velocity: Velocity of the note-on event, 1 to 127.
+        channel: Channel of the note, 0 to 15.
+    """
+
+    __slots__ = ()
+
+
+def _varlen(data, index):
+    """Reads a variable-length quantity and returns it and the next index.
+    """
+    value = 0
+    while True:
+        byte = data[index]
+        index += 1
+        value = value << 7 | byte & 0x7F
+        if byte < 0x80:
+            return value, index
+
+
+class MidiFile:
+    """Standard MIDI File mapped into memory, read without copying.
+
+    Used as a context, which unmaps the file when it ends. The notes must be
+    read before that.
+
+    Attributes:
+        path (str): Path of the file.
+        format (int): 0 for a single track, 1 for simultaneous tracks, 2 for
+            independent ones.
+        division (int): Ticks per beat, or per second for a timecode
+            division.
+        tracks (list): Memoryview of the events of each track.
+
+    Methods:
+        notes: Yields the notes of every track.
+        close: Unmaps the file.
+    """
+
+    def __init__(self, path):
+        """Maps a file and finds its header and tracks.
+
+        Raises:
+            ValueError: if the file isn't a Standard MIDI File.
+        """
+        self.path = path
+        with open(path, "rb") as file:
+            try:
+                self._map = mmap.mmap(file.fileno(), 0,
+                                      access=mmap.ACCESS_READ)
+            except ValueError:
+                raise ValueError("{} is empty".format(path)) from None
+        self._view = memoryview(self._map)
+        self.tracks = []
+        try:
+            self._read_chunks()
+        except (ValueError, IndexError) as error:
+            self.close()
+            raise ValueError("{} is not a Standard MIDI File: {}".format(
+                path, error)) from None
+
+    def _read_chunks(self):
+        """Reads the header and slices the view into tracks."""
+        view = self._view
+        if view[:4] != b"MThd":
+            raise ValueError("no header")
+        length = int.from_bytes(view[4:8], "big")
+        self.format = int.from_bytes(view[8:10], "big")
+        division = int.from_bytes(view[12:14], "big")
+        if division & 0x8000:
+            # Frames per second, stored negative, times ticks per frame.
+            frames = 256 - (division >> 8)
+            division = frames * (division & 0xFF)
+        if not division:
+            raise ValueError("no division")
+        self.division = division
+
+        index = 8 + length
+        while index + 8 <= len(view):
+            kind = bytes(view[index:index + 4])
+            length = int.from_bytes(view[index + 4:index + 8], "big")
+            start = index + 8
+            if start + length > len(view):
+                raise ValueError("truncated track")
+            if kind == b"MTrk":
+                self.tracks.append(view[start:start + length])
+            index = start + length
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def close(self):
+        """Releases the views and unmaps the file."""
+        for track in self.tracks:
+            track.release()
+        self.tracks = []
+        self._view.release()
+        self._map.close()
+
+    def notes(self, drums=False):
+        """Yields the notes of every track, track after track.
+
+        A note-on with velocity 0 ends a note, as a note-off does. Notes on
+        the same key and channel end in the order they started, and those
+        left sounding end with their track.
+
+        Args:
+            drums (bool): if true, the notes of the drum channel are kept.
+
+        Raises:
+            ValueError: if a track has an event without a status, or ends
+                inside an event.
+        """
+        for number, data in enumerate(self.tracks):
+            try:
+                yield from self._track_notes(data, drums)
+            except IndexError:
+                raise ValueError("{}: track {} ends inside an event".format(
+                    self.path, number)) from None
+
+    def _track_notes(self, data, drums):
+        """Yields the notes of one track."""
+        sounding = collections.defaultdict(collections.deque)
+        index = 0
+        tick = 0
+        status = 0
+        size = len(data)
+        while index < size:
+            delta, index = _varlen(data, index)
+            tick += delta
+            byte = data[index]
+            if byte == 0xFF:
+                kind = data[index + 1]
+                length, index = _varlen(data, index + 2)
+                index += length
+                if kind == 0x2F:
+                    break
+                continue
+            if byte in (0xF0, 0xF7):
+                length, index = _varlen(data, index + 1)
+                index += length
+                continue
+            if byte & 0x80:
+                status = byte
+                index += 1
+            elif not status:
+                raise ValueError("{}: event without a status at byte "
+                                 "{}".format(self.path, index))
+
+            kind = status & 0xF0
+            if kind in (0xC0, 0xD0):
+                index += 1
+                continue
+            pitch, velocity = data[index], data[index + 1]
+            index += 2
+            channel = status & 0x0F
+            if kind not in (0x80, 0x90) or (channel == DRUMS and not drums):
+                continue
+            if kind == 0x90 and velocity:
+                sounding[channel, pitch].append((tick, velocity))
+            elif sounding[channel, pitch]:
+                start, velocity = sounding[channel, pitch].popleft()
+                yield Note(start, tick, pitch, velocity, channel)
+
+        for (channel, pitch), starts in sounding.items():
+            for start, velocity in starts:
+                yield Note(start, tick, pitch, velocity, channel)
+
+
+def windows(notes, ticks=None):
+    """Adds notes up into pitch-class histograms, one per window.
+
+    Each note adds, to the bin of its pitch class in each window, the
+    ticks it sounds in the window.
+
+    Args:
+        notes (iterable): Note instances, in any order.
+        ticks (int): length of a window in ticks, one window for all notes
+            if None.
+
+    Returns:
+        histograms (list): 12 weights per window, in ticks.
+        lowest (list): lowest pitch sounding in each window, None if none.
+    """
+    histograms = []
+    lowest = []
+    for note in notes:
+        if note.end <= note.start:
+            continue
+        first, last = ((note.start // ticks, (note.end - 1) // ticks)
+                       if ticks else (0, 0))
+        while len(histograms) <= last:
+            histograms.append([0.0] * 12)
+            lowest.append(None)
+        for window in range(first, last + 1):
+            if ticks:
+                sounds = (min(note.end, (window + 1) * ticks)
+                          - max(note.start, window * ticks))
+            else:
+                sounds = note.end - note.start
+            histograms[window][note.pitch % 12] += sounds
+            if lowest[window] is None or note.pitch < lowest[window]:
+                lowest[window] = note.pitch
+    return histograms, lowest
+
+
+def _keys(found):
+    """Turns the (tonic, scale, confidence) tuples of keyscore into dicts."""
+    return [{"tonic": tonic, "scale": scale, "confidence": confidence}
+            for tonic, scale, confidence in found]
+
+
+def analyse(path, top=3, window=None, chords=False, drums=False):
+    """Returns the keys of a MIDI file, and of each of its windows.
+
+    Args:
+        path (str): path of the file.
+        top (int): number of keys returned, for the file and each window.
+        window (float): length of each window in beats. If None, only the
+            keys of the whole file are returned.
+        chords (bool): if true, each window also gets the chord sounding
+            the most in it, spelled in the key of the file.
+        drums (bool): if true, the notes of the drum channel count.
+
+    Returns:
+        dict: the file's path, its keys and, with a window, its length
+            in beats and the start, keys and chord of each window.
+
+    Raises:
+        ValueError: if the file can't be read.
+    """
+    with MidiFile(path) as midi:
+        division = midi.division
+        ticks = max(round(window * division), 1) if window else None
+        histograms, lowest = windows(midi.notes(drums), ticks)
+
+    total = [sum(column) for column in zip(*histograms)]
+    record = {"file": path, "beats": None, "keys": []}
+    if total:
+        record["keys"] = _keys(keyscore.rank_weighted_many([total], top)[0])
+    if ticks:
+        record["beats"] = round(len(histograms) * ticks / division, 3)
+        # The windows are ranked all at once.
+        ranked = (keyscore.rank_weighted_many(histograms, top)
+                  if histograms else [])
+        record["windows"] = []
+        names = None
+        if record["keys"]:
+            key = record["keys"][0]
+            names = transpose.key_spelling(base.pitch_class(key["tonic"]),
+                                           key["scale"])
+        for number, (histogram, keys) in enumerate(zip(histograms, ranked)):
+            entry = {"start": round(number * ticks / division, 3),
+                     "keys": _keys(keys) if any(histogram) else []}
+            if chords:
+                entry["chord"] = (
+                    chordindex.label(histogram, lowest[number], names)
+                    if lowest[number] is not None else None)
+            record["windows"].append(entry)
+    return record
+
+
+def analyse_many(paths, workers=1, **options):
+    """Yields the records of 'analyse' for many files, in input order.
+
+    A file that can't be read gives a record with its path and the error.
+
+    Args:
+        paths (iterable): paths of MIDI files.
+        workers (int): number of processes, see 'parallel.analyse_files'.
+        options: the arguments of 'analyse' after the path.
+    """
+    return parallel.analyse_files(analyse, paths, workers, **options)
+
+
+def main(argv=None):
+    """Analyses MIDI files and folders, one JSON line per file.
+
+    Returns:
+        int: 0 if every file was read, 1 otherwise.
+    """
+    parser = argparse.ArgumentParser(
+        description="Find the keys and chords of MIDI files.")
+    parser.add_argument("paths", nargs="+", help="MIDI files or folders")
+    parser.add_argument("--window", type=float,
+                        help="also analyse windows of this many beats")
+    parser.add_argument("--top", type=int, default=3)
+    parser.add_argument("--chords", action="store_true",
+                        help="name the chord of each window")
+    parser.add_argument("--drums", action="store_true",
+                        help="count the notes of the drum channel")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of processes, 0 for one per CPU "
+                             "(default: 1)")
+    args = parser.parse_args(argv)
+
+    status = 0
+    paths = parallel.find_files(args.paths, EXTENSIONS)
+    for record in analyse_many(paths, args.workers or None,
+                               top=args.top, window=args.window,
+                               chords=args.chords, drums=args.drums):
+        status |= "error" in record
+        sys.stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
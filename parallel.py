@@ -0,0 +1,186 @@
+"""Module to analyse large corpora across several processes.
+
+Splits a corpus in chunks and sends them to a ProcessPoolExecutor whose
+workers are initialized once with the scales of the parent process, building
+their scale templates and chord tables before the first task. Only a few
+chunks per worker are in flight at a time and the results come back in the
+order of the input, so corpora larger than memory can be streamed through.
+
+Imports:
+    collections, concurrent.futures, functools, itertools, os: handle the
+        pool of processes, the chunking and the folders of files.
+    baseclasses: contains the Chord and Scale classes.
+    chartstream: contains the stages of key finding per song.
+    chordindex: names chords from their notes.
+    keyscore: ranks pitch-class vectors against every scale on every key.
+
+Functions:
+    chunks(): splits an iterable in lists of a given size.
+    imap(): applies a chunk task across processes, yielding ordered results.
+    keyfind_songs(): finds the keys of songs, as 'chartstream' does.
+    decompose_chords(): decomposes chord names into their notes.
+    compose_chords(): names chords from their notes, with all inversions.
+    find_files(): yields the files of some paths and folders.
+    analyse_files(): applies an analysis to many files, errors included.
+"""
+import collections
+import concurrent.futures
+import functools
+import itertools
+import os
+
+import baseclasses
+import chartstream
+import chordindex
+import keyscore
+
+CHUNK_SIZE = 256
+
+
+def _init_worker(scales):
+    """Declares the parent's scales in a worker and builds its tables."""
+    for name, structure in scales.items():
+        baseclasses.Scale(name, " ".join(structure))
+    keyscore.templates()
+    chordindex.table()
+
+
+def _keyfind_chunk(songs, top):
+    """Task returning the records of 'chartstream' for a chunk of songs."""
+    records = chartstream.score_songs(
+        chartstream.decompose_songs(chartstream.parse_songs(songs)), top)
+    return list(records)
+
+
+def _decompose_chunk(names):
+    """Task returning the notes of a chunk of chord names."""
+    output = []
+    for name in names:
+        chord = baseclasses.Chord(name)
+        chord.decompose()
+        output.append(chord.notes)
+    return output
+
+
+def _compose_chunk(note_lists):
+    """Task returning the names of a chunk of chords, one per inversion."""
+    return [chordindex.identify(notes) for notes in note_lists]
+
+
+def _file_record(function, path, options):
+    """Returns the record of a file, or one with its path and the error."""
+    try:
+        return function(path, **options)
+    except (OSError, ValueError, IndexError) as error:
+        return {"file": path, "error": str(error)}
+
+
+def _files_chunk(paths, function, options):
+    """Task returning the records of a chunk of files."""
+    return [_file_record(function, path, options) for path in paths]
+
+
+def chunks(items, size):
+    """Splits an iterable in lists of 'size' items, the last one shorter."""
+    iterator = iter(items)
+    chunk = list(itertools.islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(itertools.islice(iterator, size))
+
+
+def imap(task, items, workers=None, chunksize=CHUNK_SIZE):
+    """Applies a chunk task across processes and yields ordered results.
+
+    Keeps at most two chunks per worker waiting, so the input is read as
+    the results are consumed instead of all at once.
+
+    Args:
+        task (callable): picklable function taking a list of items and
+            returning a list with one result per item.
+        items (iterable): items of the corpus.
+        workers (int): number of processes, the number of CPUs if None.
+        chunksize (int): number of items sent to a worker at a time.
+    """
+    workers = workers or os.cpu_count() or 1
+    scales = dict(baseclasses.Scale.name_struct)
+    with concurrent.futures.ProcessPoolExecutor(
+            workers, initializer=_init_worker,
+            initargs=(scales,)) as executor:
+        pending = collections.deque()
+        for chunk in chunks(items, chunksize):
+            pending.append(executor.submit(task, chunk))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def keyfind_songs(songs, top=3, workers=None, chunksize=CHUNK_SIZE):
+    """Finds the keys of songs across processes.
+
+    Args:
+        songs (iterable): pairs of a song's number and its chart text, as
+            yielded by 'chartstream.read_songs'.
+        top (int): number of keys per song.
+
+    Yields:
+        dict: the records of 'chartstream.score_songs', in input order.
+    """
+    task = functools.partial(_keyfind_chunk, top=top)
+    return imap(task, songs, workers, chunksize)
+
+
+def decompose_chords(names, workers=None, chunksize=CHUNK_SIZE):
+    """Yields the notes of each chord name, in input order."""
+    return imap(_decompose_chunk, names, workers, chunksize)
+
+
+def compose_chords(note_lists, workers=None, chunksize=CHUNK_SIZE):
+    """Yields the names of each chord and its inversions, in input order.
+
+    Args:
+        note_lists (iterable): lists of note names, the root first.
+    """
+    return imap(_compose_chunk, note_lists, workers, chunksize)
+
+
+def find_files(paths, extensions):
+    """Yields the paths given, and the files in the folders given.
+
+    Args:
+        paths (iterable): paths of files or folders.
+        extensions (tuple): lowercase endings of the files taken from the
+            folders. i.e: (".mid", ".midi")
+    """
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for folder, _, names in sorted(os.walk(path)):
+            for name in sorted(names):
+                if name.lower().endswith(extensions):
+                    yield os.path.join(folder, name)
+
+
+def analyse_files(function, paths, workers=1, chunksize=16, **options):
+    """Yields the record of an analysis of each file, in input order.
+
+    A file that can't be read gives a record with its path and the error,
+    so one bad file doesn't stop a batch.
+
+    Args:
+        function (callable): picklable function taking a path and the
+            options and returning a dict.
+        paths (iterable): paths of the files.
+        workers (int): number of processes, none started if 1.
+        chunksize (int): number of files sent to a worker at a time.
+        options: keyword arguments of 'function'.
+    """
+    if workers == 1:
+        for path in paths:
+            yield _file_record(function, path, options)
+        return
+    task = functools.partial(_files_chunk, function=function,
+                             options=options)
+    yield from imap(task, paths, workers, chunksize)
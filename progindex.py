@@ -0,0 +1,366 @@
+"""Module to index a corpus of songs by their progressions, in any key.
+
+Each song is stored as a sequence of tokens, one per chord, that don't depend
+on its key: the interval of the chord's root from the song's tonic, found as
+'keyscore' finds the key, and the mask of the chord's intervals from its own
+root. Repeated chords, as in "C | C | F", count once. Every run of 'n'
+tokens (an n-gram) points to the songs that have it, in an inverted index.
+
+A query is tried on the 12 tonics, so a progression is found whatever key it
+is written in and whatever key its songs are in:
+    - 'lookup' returns the songs holding the progression itself, each with
+      the semitones the query must be transposed by to match it.
+    - 'similar' ranks the songs by the n-grams they share with the query,
+      each weighted by how rare it is (cosine of their tf-idf vectors).
+
+Once built, the index is held in a few NumPy arrays (postings, offsets and
+tokens), so queries add up posting lists with 'np.bincount' instead of
+walking them, and it is saved to and loaded from a single '.npz' file.
+
+Imports:
+    array, math: hold and weigh the index while it is built.
+    numpy: holds the built index and scores the queries.
+    base: contains the chromatic scale and pitch-class functions.
+    baseclasses: contains the interned FrozenChord.
+    chartstream: splits charts into chord names.
+    keyscore: finds the key of each song.
+
+Classes:
+    ProgressionIndex: Inverted index of the n-grams of songs.
+
+Functions:
+    build(): indexes chord charts, one song per chart.
+"""
+import array
+import math
+
+import numpy as np
+
+import base
+import baseclasses
+import chartstream
+import keyscore
+
+
+class ProgressionIndex:
+    """Class to index songs by their progressions and search them.
+
+    Songs are added one at a time into lists, and the lists are turned into
+    arrays by 'freeze' before the first query after an addition.
+
+    Attributes:
+        n (int): Number of chords of each n-gram. Queries must have at least
+            as many chords, once repeated ones are counted once.
+        labels (list): Label of each song, by song number.
+        tonics (array): Pitch class of the tonic found for each song.
+
+    Methods:
+        tokens: Returns the tokens of chords relative to a tonic.
+        add: Adds a song to the index.
+        freeze: Turns the index into arrays, done before queries.
+        lookup: Returns the songs holding a progression, in any key.
+        similar: Returns the songs sharing the most n-grams with a query.
+        song: Returns the label, tonic and tokens of a song.
+        save: Writes the index to a '.npz' file.
+        load: Reads an index written by 'save'.
+    """
+
+    def __init__(self, n=3):
+        """Starts an empty index of n-grams of 'n' chords (2 to 4)."""
+        if not 2 <= n <= 4:
+            raise ValueError("n-grams must have from 2 to 4 chords")
+        self.n = n
+        self.labels = []
+        self.tonics = array.array("B")
+        self._tokens = array.array("H")
+        self._starts = array.array("q", [0])
+        self._postings = {}
+        self._arrays = None
+
+    @staticmethod
+    def tokens(chords, tonic):
+        """Returns the tokens of chords relative to a tonic.
+
+        A token packs, in 16 bits, the interval of the chord's root from
+        the tonic (above bit 12) and the mask of the chord's intervals from
+        its root. Repeated chords count once.
+
+        Args:
+            chords (list): chord names or FrozenChord instances.
+            tonic (int): pitch class of the tonic.
+        """
+        output = []
+        for chord in chords:
+            if not isinstance(chord, baseclasses.FrozenChord):
+                chord = baseclasses.FrozenChord(chord)
+            token = (chord.root - tonic) % 12 << 12 | chord.intervals()
+            if not output or output[-1] != token:
+                output.append(token)
+        return output
+
+    def _grams(self, tokens):
+        """Returns the distinct n-grams of tokens, each packed in an int."""
+        grams = set()
+        for start in range(len(tokens) - self.n + 1):
+            gram = 0
+            for token in tokens[start:start + self.n]:
+                gram = gram << 16 | token
+            grams.add(gram)
+        return grams
+
+    def add(self, chords, label=None, tonic=None):
+        """Adds a song to the index.
+
+        Args:
+            chords (list): chord names of the song, in order.
+            label (str): label of the song, its number if None.
+            tonic (str): tonic of the song, the first of the keys found by
+                'keyscore.rank_chords' if None.
+
+        Returns:
+            int: the song's number.
+        """
+        number = len(self.labels)
+        if self._postings is None:
+            self._thaw()
+        if tonic is None:
+            tonic = keyscore.rank_chords(chords, 1)[0][0] if chords else "C"
+        pitch = base.pitch_class(tonic)
+        tokens = self.tokens(chords, pitch)
+        for gram in self._grams(tokens):
+            self._postings.setdefault(gram, array.array("I")).append(number)
+
+        self.labels.append(str(number) if label is None else str(label))
+        self.tonics.append(pitch)
+        self._tokens.extend(tokens)
+        self._starts.append(len(self._tokens))
+        self._arrays = None
+        return number
+
+    def freeze(self):
+        """Turns the posting lists into arrays and weighs the n-grams.
+
+        The n-grams are sorted so that they are found by binary search, and
+        their posting lists are laid end to end. Each n-gram is weighted by
+        its inverse document frequency, and the norm of each song's vector
+        of weights is kept for 'similar'.
+        """
+        if self._arrays is not None:
+            return self._arrays
+
+        grams = np.array(sorted(self._postings), dtype=np.uint64)
+        lengths = np.array([len(self._postings[int(gram)])
+                            for gram in grams], dtype=np.int64)
+        offsets = np.zeros(len(grams) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        postings = np.empty(offsets[-1], dtype=np.uint32)
+        for index, gram in enumerate(grams):
+            postings[offsets[index]:offsets[index + 1]] = (
+                self._postings[int(gram)])
+        self._arrays = self._weigh({"grams": grams, "offsets": offsets,
+                                    "postings": postings})
+        return self._arrays
+
+    def _thaw(self):
+        """Turns the arrays of a loaded index back into posting lists."""
+        arrays = self._arrays
+        offsets = arrays["offsets"]
+        self._postings = {
+            int(gram): array.array("I", arrays["postings"][
+                offsets[index]:offsets[index + 1]].tobytes())
+            for index, gram in enumerate(arrays["grams"])}
+
+    def _weigh(self, arrays):
+        """Adds the weight of each n-gram and the norm of each song."""
+        songs = max(len(self.labels), 1)
+        lengths = np.diff(arrays["offsets"])
+        weights = np.log(songs / np.maximum(lengths, 1)) + 1
+        arrays["weights"] = weights
+        arrays["norms"] = np.sqrt(np.bincount(
+            arrays["postings"], weights=np.repeat(weights ** 2, lengths),
+            minlength=len(self.labels)))
+        return arrays
+
+    def _find(self, gram):
+        """Returns the index of an n-gram in the arrays, or -1."""
+        grams = self.freeze()["grams"]
+        index = int(np.searchsorted(grams, np.uint64(gram)))
+        if index < len(grams) and int(grams[index]) == gram:
+            return index
+        return -1
+
+    def _query(self, chords):
+        """Yields, for each of the 12 tonics, the query's tokens and grams.
+
+        Raises:
+            ValueError: if the query has fewer chords than 'n'.
+        """
+        chords = [baseclasses.FrozenChord(chord) for chord in chords]
+        for tonic in range(12):
+            tokens = self.tokens(chords, tonic)
+            if len(tokens) < self.n:
+                raise ValueError("queries need at least {} different chords "
+                                 "in a row".format(self.n))
+            yield tonic, tokens, self._grams(tokens)
+
+    def song(self, number):
+        """Returns the label, the tonic and the tokens of a song."""
+        starts = self._starts
+        return (self.labels[number], base.notes[self.tonics[number]],
+                self._tokens[starts[number]:starts[number + 1]].tolist())
+
+    def _transposition(self, number, tonic):
+        """Returns the semitones from a query on 'tonic' to a song."""
+        return (self.tonics[number] - tonic) % 12
+
+    def lookup(self, chords, limit=None):
+        """Returns the songs holding a progression, in any key.
+
+        The songs with all of the query's n-grams are found by intersecting
+        their posting lists, shortest first, then checked for the whole
+        progression when it is longer than one n-gram.
+
+        Args:
+            chords (list): chord names of the progression.
+            limit (int): largest number of songs returned, all if None.
+
+        Returns:
+            list: pairs of the song's label and the semitones the query
+                must be transposed by to match it, by song number.
+        """
+        arrays = self.freeze()
+        offsets, postings = arrays["offsets"], arrays["postings"]
+        found = {}
+        for tonic, tokens, grams in self._query(chords):
+            indices = [self._find(gram) for gram in grams]
+            if -1 in indices:
+                continue
+            indices.sort(key=lambda index: offsets[index + 1]
+                         - offsets[index])
+            candidates = postings[offsets[indices[0]]:
+                                  offsets[indices[0] + 1]]
+            for index in indices[1:]:
+                candidates = np.intersect1d(
+                    candidates, postings[offsets[index]:offsets[index + 1]],
+                    assume_unique=True)
+            for number in candidates.tolist():
+                if number in found:
+                    continue
+                if len(tokens) > self.n and not self._holds(number, tokens):
+                    continue
+                found[number] = self._transposition(number, tonic)
+
+        numbers = sorted(found)[:limit]
+        return [(self.labels[number], found[number]) for number in numbers]
+
+    def _holds(self, number, tokens):
+        """Checks if a song's tokens hold a run of tokens."""
+        start, end = self._starts[number], self._starts[number + 1]
+        song = self._tokens[start:end]
+        size = len(tokens)
+        first = tokens[0]
+        for position in range(len(song) - size + 1):
+            if (song[position] == first
+                    and song[position:position + size].tolist() == tokens):
+                return True
+        return False
+
+    def similar(self, chords, top=10):
+        """Returns the songs sharing the most n-grams with a query.
+
+        Each song is scored by the cosine between its vector of n-gram
+        weights and the query's, on the tonic that matches it best.
+
+        Args:
+            chords (list): chord names of the query.
+            top (int): number of songs returned.
+
+        Returns:
+            list: tuples of the song's label, its score between 0 and 1 and
+                the semitones the query must be transposed by to match it,
+                the best first.
+        """
+        arrays = self.freeze()
+        offsets, postings = arrays["offsets"], arrays["postings"]
+        weights, norms = arrays["weights"], arrays["norms"]
+        songs = len(self.labels)
+        best = np.zeros(songs)
+        best_tonic = np.zeros(songs, dtype=np.int64)
+        for tonic, _, grams in self._query(chords):
+            indices = [index for index in map(self._find, grams)
+                       if index >= 0]
+            # Query n-grams absent from the index still count in its norm.
+            query_norm = math.sqrt(sum(
+                weights[index] ** 2 for index in indices)
+                + (len(grams) - len(indices)) * (math.log(songs or 1) + 1)
+                ** 2)
+            if not indices:
+                continue
+            lists = [postings[offsets[index]:offsets[index + 1]]
+                     for index in indices]
+            scores = np.bincount(
+                np.concatenate(lists),
+                weights=np.repeat(weights[indices] ** 2,
+                                  [len(songs_of) for songs_of in lists]),
+                minlength=songs)
+            scores /= np.maximum(norms, 1e-12) * query_norm
+            better = scores > best
+            best[better] = scores[better]
+            best_tonic[better] = tonic
+
+        count = min(top, int(np.count_nonzero(best)))
+        if not count:
+            return []
+        order = np.argpartition(-best, count - 1)[:count]
+        order = order[np.lexsort((order, -best[order]))]
+        return [(self.labels[number], round(float(best[number]), 4),
+                 self._transposition(number, int(best_tonic[number])))
+                for number in order.tolist()]
+
+    def save(self, path):
+        """Writes the index to a '.npz' file, read back by 'load'."""
+        arrays = self.freeze()
+        np.savez(path, n=self.n, labels=np.array(self.labels, dtype=str),
+                 tonics=np.frombuffer(self.tonics, dtype=np.uint8),
+                 tokens=np.frombuffer(self._tokens, dtype=np.uint16),
+                 starts=np.frombuffer(self._starts, dtype=np.int64),
+                 grams=arrays["grams"], offsets=arrays["offsets"],
+                 postings=arrays["postings"])
+
+    @classmethod
+    def load(cls, path):
+        """Reads an index written by 'save'.
+
+        The posting lists stay in arrays: the index can be queried, and
+        songs added to it turn them back into lists first.
+        """
+        with np.load(path) as data:
+            index = cls(int(data["n"]))
+            index.labels = data["labels"].tolist()
+            index.tonics = array.array("B", data["tonics"].tobytes())
+            index._tokens = array.array("H", data["tokens"].tobytes())
+            index._starts = array.array("q", data["starts"].tobytes())
+            arrays = {"grams": data["grams"], "offsets": data["offsets"],
+                      "postings": data["postings"]}
+        index._arrays = index._weigh(arrays)
+        index._postings = None
+        return index
+
+
+def build(charts, n=3):
+    """Indexes chord charts, one song per chart.
+
+    Args:
+        charts (iterable): pairs of a song's label and its chart text, as
+            'chartstream.read_songs' yields them. Bar lines and invalid
+            chord names are left out.
+        n (int): number of chords of each n-gram.
+
+    Returns:
+        ProgressionIndex: the index of the songs.
+    """
+    index = ProgressionIndex(n)
+    for record in chartstream.parse_songs(charts):
+        index.add(record["chords"], record["song"])
+    index.freeze()
+    return index
@@ -0,0 +1,106 @@
+"""Module to find the scales holding a set of notes through a subset index.
+
+For each scale stored in the Scale class, on each of the 12 keys, every
+subset of its pitch-class mask is listed once, so the index holds, for each
+of the 4096 masks, the (tonic, scale) pairs whose notes contain it, ranked
+by how many notes they have besides: the fewest first, then in the order
+the scales were declared and the keys in that of 'base.notes'. A query is
+then one list access, whatever the number of scales.
+
+The index is built on the first query, and built again on the first query
+after the stored scales change, as told by the version of the Scale class.
+The default scales of 'scalemaker' are declared on the first query.
+
+Imports:
+    base: contains the chromatic scale and pitch-class functions.
+    baseclasses: contains the Chord and Scale classes.
+    scalemaker: declares the default scales to the Scale class.
+
+Functions:
+    table(): returns the index, building it when the scales change.
+    scales_of_mask(): returns the scales holding a pitch-class mask.
+    scales_of_notes(): returns the scales holding some notes.
+    scales_of_chords(): returns the scales holding the notes of chords.
+"""
+import base
+import baseclasses
+import scalemaker
+
+_cache = {"version": None, "table": ()}
+
+
+def table():
+    """Returns the index, building it when the stored scales change.
+
+    Returns:
+        tuple: for each of the 4096 masks, a tuple of the (tonic, scale,
+            extra notes) triples of the scales holding it, the fewest extra
+            notes first.
+    """
+    scalemaker.register()
+    if _cache["version"] != baseclasses.Scale.version:
+        index = [[] for _ in range(4096)]
+        for order, (name, mask) in enumerate(
+                baseclasses.Scale.name_mask.items()):
+            size = base.popcount(mask)
+            for pitch, tonic in enumerate(base.notes):
+                scale = base.rotate(mask, pitch)
+                # Walks every subset of the scale's mask, itself included.
+                subset = scale
+                while True:
+                    index[subset].append((size - base.popcount(subset),
+                                          order, pitch, tonic, name))
+                    if not subset:
+                        break
+                    subset = (subset - 1) & scale
+        _cache["table"] = tuple(
+            tuple((tonic, name, extra)
+                  for extra, _, _, tonic, name in sorted(entries))
+            for entries in index)
+        _cache["version"] = baseclasses.Scale.version
+
+    return _cache["table"]
+
+
+def scales_of_mask(mask, top=None):
+    """Returns the scales holding every pitch class of a mask.
+
+    Args:
+        mask (int): pitch-class mask of the notes.
+        top (int): largest number of scales returned, all if None.
+
+    Returns:
+        tuple: (tonic, scale, extra notes) triples, the fewest extra notes
+            first.
+    """
+    return table()[mask & base.FULL_MASK][:top]
+
+
+def scales_of_notes(notes, top=None):
+    """Returns the scales holding some notes, as 'scales_of_mask' does.
+
+    Raises:
+        ValueError: if a note can't be read.
+    """
+    return scales_of_mask(base.notes_mask(notes), top)
+
+
+def scales_of_chords(chords, top=None):
+    """Returns the scales holding the notes of chords.
+
+    Args:
+        chords (list): chord names, or Chord instances, decomposed if they
+            weren't yet.
+        top (int): largest number of scales returned, all if None.
+
+    Raises:
+        ValueError: if a chord name can't be read.
+    """
+    mask = 0
+    for chord in chords:
+        if not isinstance(chord, baseclasses.Chord):
+            chord = baseclasses.Chord(chord)
+        if not chord.root:
+            chord.decompose()
+        mask |= chord.mask
+    return scales_of_mask(mask, top)
@@ -5,29 +5,41 @@ Store declared scales in a class dictionary from the import (see its
 documentation for further detail) and return a certain key (chosen by the user)
 of one of them.
 
+Nothing is declared when importing this module: 'register' does it, and is
+called by the modules that need every scale.
+
 Imports:
     baseclasses: gets the essential Scale class
 Functions:
+    register(): declares the scales of 'scales' to the Scale class.
     scalemake(): handles the process of user input and scale output.
 """
 
 import baseclasses
 
-# Declaring scales to the dictionary in the imported class Scale.
-# First the standard major and minor scales.
-baseclasses.Scale("M", "I II III IV V VI VII")
-baseclasses.Scale("m", "I II iii IV V vi vii")
-baseclasses.Scale("Hm", "I II iii IV V vi VII")
-baseclasses.Scale("Mm", "I II iii IV V VI VII")
-
-# Now, the greek modes.
-baseclasses.Scale("J", "I II III IV V VI VII")
-baseclasses.Scale("d", "I II iii IV V VI vii")
-baseclasses.Scale("f", "I ii iii IV V vi vii")
-baseclasses.Scale("Li", "I II III v V VI VII")
-baseclasses.Scale("M", "I II III IV V VI vii")
-baseclasses.Scale("E", "I II iii IV V vi vii")
-baseclasses.Scale("lo", "I ii iii IV v vi vii")
+# Scales declared to the dictionary in the imported class Scale by
+# 'register'. First the standard major and minor scales, then the greek modes.
+scales = (("M", "I II III IV V VI VII"),
+          ("m", "I II iii IV V vi vii"),
+          ("Hm", "I II iii IV V vi VII"),
+          ("Mm", "I II iii IV V VI VII"),
+          ("J", "I II III IV V VI VII"),
+          ("d", "I II iii IV V VI vii"),
+          ("f", "I ii iii IV V vi vii"),
+          ("Li", "I II III v V VI VII"),
+          ("Mi", "I II III IV V VI vii"),
+          ("E", "I II iii IV V vi vii"),
+          ("lo", "I ii iii IV v vi vii"))
+_registered = False
+
+
+def register():
+    """Declares the scales above to the Scale class, only the first time."""
+    global _registered
+    if not _registered:
+        for name, structure in scales:
+            baseclasses.Scale(name, structure)
+        _registered = True
 
 
 def scalemake():
@@ -35,15 +47,14 @@ def scalemake():
 
     Vars:
         scale: scale chosen by user to be applied in a certain key.
-        tones: all keys's notes in the chosen scale
         key: key chosen by user
     """
     prompt = ("Selecione a escala que deseja usar. Digite 'M' para a escala "
               "diatnica maior e 'm' para a escala diatnica menor.\n")
     print(prompt)
+    register()
     scale = input("Insira: ")
-    tones = baseclasses.Scale.apply(scale)
 
     print("\nAgora digite, em maiscula, o tom que deseja.\n")
     key = input("Insira: ")
-    print(tones[key])
+    print(list(baseclasses.Scale.notes(scale, key)))
@@ -0,0 +1,532 @@
+"""Module with an HTTP service finding keys, decomposing and naming chords.
+
+Built on asyncio streams only. Each endpoint takes its fields as query
+parameters (GET) or as a JSON object (POST), and answers with JSON:
+    /keyfind?chords=C F G7 C&top=3     most probable keys of a progression
+    /decompose?chord=Dm7(b9)           notes of a chord name
+    /identify?notes=C E G Bb           names of a chord, one per inversion
+    /scale?name=M&key=D                notes of a scale, on every key if
+                                       'key' is left out
+    /metrics                           latency histograms, batches and
+                                       rejected requests
+    /health                            "ok"
+
+The scales, the scale templates and the chord index are built once, at
+startup. Key finding requests arriving within a few milliseconds of each
+other are scored together, with a single call to 'keyscore.rank_many'.
+
+Two limits keep an overloaded service responsive: connections beyond
+'max_connections' and requests beyond 'max_requests' in progress are
+answered with 503 at once instead of waiting, and bodies over MAX_BODY
+bytes with 413.
+
+Run as a script:
+    python server.py [--host HOST] [--port PORT] [--window SECONDS]
+                     [--max-batch N] [--max-connections N]
+                     [--max-requests N]
+
+Imports:
+    argparse, asyncio, bisect, json, logging, time, urllib.parse: serve
+        HTTP, log the failed requests and measure the latencies.
+    numpy: stacks the vectors of a batch.
+    base: contains the chromatic scale.
+    baseclasses: contains the Scale class.
+    chordindex: names chords from their notes.
+    chordparser: returns the notes and pitch-class masks of chord names.
+    keyscore: ranks pitch-class vectors against every scale on every key.
+    scalemaker: declares the scales.
+
+Vars:
+    MAX_BODY (int): largest body accepted, in bytes.
+    BUCKETS (tuple): upper bounds of the latency histograms, in
+        milliseconds.
+
+Classes:
+    HTTPError: Error answered with an HTTP status.
+    Histogram: Counts latencies in buckets.
+    Batcher: Groups the key finding requests arriving close together.
+    Service: Handles the connections and the endpoints.
+
+Functions:
+    preload(): builds every table used by the endpoints.
+    serve(): starts a Service and serves until cancelled.
+    main(): runs the service from the command line.
+"""
+import argparse
+import asyncio
+import bisect
+import json
+import logging
+import time
+import urllib.parse
+
+import numpy as np
+
+import base
+import baseclasses
+import chordindex
+import chordparser
+import keyscore
+import scalemaker
+
+MAX_BODY = 65536
+BUCKETS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+_log = logging.getLogger(__name__)
+
+_reasons = {200: "OK", 400: "Bad Request", 404: "Not Found",
+            405: "Method Not Allowed", 413: "Payload Too Large",
+            500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class HTTPError(Exception):
+    """Error answered with an HTTP status and a message.
+
+    Attributes:
+        status (int): HTTP status of the answer.
+    """
+
+    def __init__(self, status, message):
+        """Keeps the status along with the message."""
+        super().__init__(message)
+        self.status = status
+
+
+class Histogram:
+    """Class to count latencies in the buckets of BUCKETS.
+
+    Attributes:
+        counts (list): Number of latencies in each bucket, the last one for
+            those above every bound.
+        total (float): Sum of the latencies, in milliseconds.
+
+    Methods:
+        add: Counts a latency.
+        quantile: Returns the bucket bound under which a share of the
+            latencies fall.
+        summary: Returns the counts and a few quantiles as a dict.
+    """
+
+    def __init__(self):
+        """Starts with every bucket empty."""
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+
+    def add(self, milliseconds):
+        """Counts a latency, in milliseconds."""
+        self.counts[bisect.bisect_left(BUCKETS, milliseconds)] += 1
+        self.total += milliseconds
+
+    def quantile(self, share):
+        """Returns the bucket bound under which 'share' of the latencies fall.
+
+        Returns None if that bound is above the last one of BUCKETS.
+        """
+        wanted = share * sum(self.counts)
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= wanted:
+                return bound
+        return None
+
+    def summary(self):
+        """Returns the counts of the buckets, the mean and a few quantiles."""
+        count = sum(self.counts)
+        buckets = {"<={}".format(bound): number
+                   for bound, number in zip(BUCKETS, self.counts)}
+        buckets[">{}".format(BUCKETS[-1])] = self.counts[-1]
+        return {"count": count,
+                "mean_ms": round(self.total / count, 3) if count else None,
+                "p50_ms": self.quantile(0.5) if count else None,
+                "p90_ms": self.quantile(0.9) if count else None,
+                "p99_ms": self.quantile(0.99) if count else None,
+                "buckets": buckets}
+
+
+class Batcher:
+    """Class to score the key finding requests arriving close together.
+
+    The first request of a batch starts a timer of 'window' seconds; when it
+    ends, or when 'max_batch' requests are waiting, all of them are scored
+    with one call to 'keyscore.rank_many' and their futures are resolved.
+
+    Attributes:
+        window (float): Seconds a batch waits for more requests.
+        max_batch (int): Number of requests that ends a batch at once.
+        pending (list): Tuples of (vector, top, future) waiting.
+        batches (int): Number of batches scored.
+        scored (int): Number of requests scored.
+        largest (int): Size of the largest batch.
+
+    Methods:
+        submit: Adds a vector to the next batch and returns its future.
+        flush: Scores the waiting vectors.
+        summary: Returns the number and sizes of the batches.
+    """
+
+    def __init__(self, window=0.002, max_batch=256):
+        """Starts with no request waiting.
+
+        Args:
+            window (float): Seconds a batch waits for more requests.
+            max_batch (int): Number of requests that ends a batch at once.
+        """
+        self.window = window
+        self.max_batch = max_batch
+        self.pending = []
+        self.batches = 0
+        self.scored = 0
+        self.largest = 0
+        self._timer = None
+
+    def submit(self, vector, top):
+        """Adds a pitch-class vector to the next batch.
+
+        Returns:
+            asyncio.Future: resolved with the 'top' keys of the vector, as
+                'keyscore.rank' returns them.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((vector, top, future))
+        if len(self.pending) >= self.max_batch:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self.flush)
+        return future
+
+    def flush(self):
+        """Scores the waiting vectors at once and resolves their futures."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self.pending = self.pending, []
+        if not batch:
+            return
+
+        top = max(top for _, top, _ in batch)
+        try:
+            rankings = keyscore.rank_many(
+                np.array([vector for vector, _, _ in batch]), top)
+        except Exception as error:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+
+        for (_, top, future), keys in zip(batch, rankings):
+            if not future.done():
+                future.set_result(keys[:top])
+        self.batches += 1
+        self.scored += len(batch)
+        self.largest = max(self.largest, len(batch))
+
+    def summary(self):
+        """Returns the number and sizes of the batches scored."""
+        return {"batches": self.batches, "requests": self.scored,
+                "mean_size": (round(self.scored / self.batches, 2)
+                              if self.batches else None),
+                "largest": self.largest}
+
+
+class Service:
+    """Class handling the connections and the endpoints of the service.
+
+    Attributes:
+        batcher (Batcher): Groups the key finding requests.
+        max_connections (int): Connections served at a time.
+        max_requests (int): Requests in progress at a time.
+        timeout (float): Seconds an idle connection is kept open.
+        connections (int): Connections open.
+        requests (int): Requests in progress.
+        rejected (dict): Number of answers with each error status.
+        latencies (dict): Pairs each endpoint with its Histogram.
+
+    Methods:
+        handle: Serves one connection, request after request.
+        dispatch: Answers one request.
+        keyfind, decompose, identify, scale, metrics, health: Endpoints.
+    """
+
+    def __init__(self, window=0.002, max_batch=256, max_connections=256,
+                 max_requests=1024, timeout=30.0):
+        """Prepares the batcher, the limits and the histograms."""
+        self.batcher = Batcher(window, max_batch)
+        self.max_connections = max_connections
+        self.max_requests = max_requests
+        self.timeout = timeout
+        self.connections = 0
+        self.requests = 0
+        self.rejected = {}
+        self.routes = {"/keyfind": self.keyfind,
+                       "/decompose": self.decompose,
+                       "/identify": self.identify,
+                       "/scale": self.scale,
+                       "/metrics": self.metrics,
+                       "/health": self.health}
+        self.latencies = {path: Histogram() for path in self.routes}
+
+    async def handle(self, reader, writer):
+        """Serves one connection, request after request while kept alive."""
+        if self.connections >= self.max_connections:
+            # The request is read first, as closing with unread data would
+            # reset the connection before the client reads the answer.
+            self._count(503)
+            try:
+                await asyncio.wait_for(self._read(reader), self.timeout)
+                await self._write(writer, 503,
+                                  {"error": "too many connections"}, False)
+            except (HTTPError, asyncio.TimeoutError,
+                    asyncio.IncompleteReadError, ConnectionError):
+                pass
+            writer.close()
+            return
+
+        self.connections += 1
+        try:
+            keep_alive = True
+            while keep_alive:
+                try:
+                    request = await asyncio.wait_for(self._read(reader),
+                                                     self.timeout)
+                except HTTPError as error:
+                    self._count(error.status)
+                    await self._write(writer, error.status,
+                                      {"error": str(error)}, False)
+                    break
+                if request is None:
+                    break
+                method, target, headers, body, keep_alive = request
+                start = time.perf_counter()
+                status, payload, path = await self.dispatch(method, target,
+                                                            body)
+                await self._write(writer, status, payload, keep_alive)
+                if path in self.latencies:
+                    self.latencies[path].add(
+                        (time.perf_counter() - start) * 1000)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError,
+                ConnectionError):
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def _read(self, reader):
+        """Reads one request, or returns None if the connection ended.
+
+        Returns:
+            tuple: method, target, headers, body and whether the connection
+                is kept alive after the answer.
+
+        Raises:
+            HTTPError: if the request is malformed or its body too large.
+        """
+        line = await reader.readline()
+        if not line.strip():
+            return None
+        try:
+            method, target, version = line.decode("latin-1").split()
+        except ValueError:
+            raise HTTPError(400, "malformed request line") from None
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            raise HTTPError(400, "invalid Content-Length") from None
+        if length > MAX_BODY:
+            raise HTTPError(413, "body over {} bytes".format(MAX_BODY))
+        body = await reader.readexactly(length) if length > 0 else b""
+
+        connection = headers.get("connection", "").lower()
+        keep_alive = (connection != "close" if version == "HTTP/1.1"
+                      else connection == "keep-alive")
+        return method, target, headers, body, keep_alive
+
+    async def _write(self, writer, status, payload, keep_alive):
+        """Writes an answer with a JSON body."""
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        head = ("HTTP/1.1 {} {}\r\nContent-Type: application/json; "
+                "charset=utf-8\r\nContent-Length: {}\r\nConnection: {}\r\n"
+                "\r\n").format(status, _reasons.get(status, ""), len(body),
+                               "keep-alive" if keep_alive else "close")
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    def _count(self, status):
+        """Counts an answer with an error status."""
+        self.rejected[status] = self.rejected.get(status, 0) + 1
+
+    async def dispatch(self, method, target, body):
+        """Answers one request.
+
+        Returns:
+            tuple: the status, the payload and the path of the endpoint.
+        """
+        url = urllib.parse.urlsplit(target)
+        path = url.path.rstrip("/") or "/"
+        try:
+            endpoint = self.routes.get(path)
+            if endpoint is None:
+                raise HTTPError(404, "no endpoint {}".format(path))
+            if method not in ("GET", "POST"):
+                raise HTTPError(405, "use GET or POST")
+            if self.requests >= self.max_requests:
+                raise HTTPError(503, "too many requests in progress")
+
+            fields = dict(urllib.parse.parse_qsl(url.query))
+            if body:
+                try:
+                    posted = json.loads(body)
+                except ValueError:
+                    raise HTTPError(400, "body is not JSON") from None
+                if not isinstance(posted, dict):
+                    raise HTTPError(400, "body is not a JSON object")
+                fields.update(posted)
+
+            self.requests += 1
+            try:
+                payload = await endpoint(fields)
+            finally:
+                self.requests -= 1
+            return 200, payload, path
+        except HTTPError as error:
+            self._count(error.status)
+            return error.status, {"error": str(error)}, path
+        except (ValueError, KeyError, TypeError) as error:
+            self._count(400)
+            return 400, {"error": str(error)}, path
+        except Exception:
+            # A bug in an endpoint answers its own request, and no other.
+            _log.exception("%s %s failed", method, target)
+            self._count(500)
+            return 500, {"error": "internal error"}, path
+
+    @staticmethod
+    def _field(fields, name):
+        """Returns a required field, raising HTTPError 400 if missing."""
+        if name not in fields:
+            raise HTTPError(400, "missing {!r}".format(name))
+        return fields[name]
+
+    @staticmethod
+    def _words(value):
+        """Splits a field into words, if it is not a list already."""
+        return value.split() if isinstance(value, str) else list(value)
+
+    async def keyfind(self, fields):
+        """Returns the most probable keys of the chords in 'chords'."""
+        chords = self._words(self._field(fields, "chords"))
+        top = int(fields.get("top", 3))
+        if not chords:
+            raise HTTPError(400, "no chords")
+        names, _, _ = keyscore.templates()
+        if not 1 <= top <= len(names) * 12:
+            raise HTTPError(400, "'top' must be from 1 to {}".format(
+                len(names) * 12))
+        vector = keyscore.chords_vector(chords)
+        keys = await self.batcher.submit(vector, top)
+        return {"chords": chords,
+                "keys": [{"tonic": tonic, "scale": scale,
+                          "percentage": percentage}
+                         for tonic, scale, percentage in keys]}
+
+    async def decompose(self, fields):
+        """Returns the notes of the chord name in 'chord'."""
+        chord = self._field(fields, "chord")
+        return {"chord": chord, "notes": chordparser.chord_notes(chord)}
+
+    async def identify(self, fields):
+        """Returns the names of the chord with the notes in 'notes'."""
+        notes = self._words(self._field(fields, "notes"))
+        if not notes:
+            raise HTTPError(400, "no notes")
+        return {"notes": notes, "names": chordindex.identify(notes)}
+
+    async def scale(self, fields):
+        """Returns the notes of the scale 'name' on 'key', or on all keys."""
+        name = self._field(fields, "name")
+        if name not in baseclasses.Scale.name_struct:
+            raise HTTPError(404, "no scale {!r}".format(name))
+        keys = [fields["key"]] if "key" in fields else base.notes
+        for key in keys:
+            try:
+                base.pitch_class(key)
+            except (ValueError, TypeError):
+                raise HTTPError(400, "no key {!r}".format(key)) from None
+        return {"scale": name,
+                "keys": {key: list(baseclasses.Scale.notes(name, key))
+                         for key in keys}}
+
+    async def metrics(self, fields):
+        """Returns the latency histograms, the batches and the rejections."""
+        return {"latency": {path: histogram.summary()
+                            for path, histogram in self.latencies.items()},
+                "batches": self.batcher.summary(),
+                "connections": self.connections,
+                "requests": self.requests,
+                "rejected": {str(status): count
+                             for status, count in self.rejected.items()}}
+
+    async def health(self, fields):
+        """Returns "ok" while the service runs."""
+        return {"status": "ok"}
+
+
+def preload():
+    """Builds the scales, their templates and tables, and the chord index."""
+    scalemaker.register()
+    for name in baseclasses.Scale.name_struct:
+        baseclasses.Scale.apply(name)
+    keyscore.templates()
+    chordindex.table()
+
+
+async def serve(host="127.0.0.1", port=8000, **options):
+    """Preloads the tables and serves until cancelled.
+
+    Args:
+        host (str): address to listen on.
+        port (int): port to listen on, 0 for any free port.
+        options: passed on to Service.
+    """
+    preload()
+    service = Service(**options)
+    server = await asyncio.start_server(service.handle, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    """Runs the service from the command line."""
+    parser = argparse.ArgumentParser(
+        description="Serve key finding and chord identification over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--window", type=float, default=0.002,
+                        help="seconds a key finding batch waits for more "
+                             "requests (default: 0.002)")
+    parser.add_argument("--max-batch", type=int, default=256)
+    parser.add_argument("--max-connections", type=int, default=256)
+    parser.add_argument("--max-requests", type=int, default=1024)
+    args = parser.parse_args(argv)
+
+    try:
+        asyncio.run(serve(args.host, args.port, window=args.window,
+                          max_batch=args.max_batch,
+                          max_connections=args.max_connections,
+                          max_requests=args.max_requests))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
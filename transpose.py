@@ -0,0 +1,425 @@
+"""Module to transpose chord charts to any key by integer arithmetic alone.
+
+A chart is read once into an integer form: for each chord, the pitch class
+of its root, the id of its suffix (all the name but the root and the bass,
+such as "m7(b5)") and the degree of its bass from the root, while the text
+between chords (spaces, bar lines, words) is kept as it is. The key of the
+chart is found from its chords, unless it is given.
+
+Writing the chart in another key then only adds the shift to each root and
+looks its name up in the spelling of the target key: the diatonic notes take
+one letter per degree (see 'base.spell_scale') and the others follow the
+side of the key's signature, sharps or flats. No chord name is read again,
+so a chart is written in all 12 keys for little more than the cost of
+reading it once.
+
+Run as a script to read the files given, or stdin if there are none:
+    python transpose.py [--blocks] [--key KEY] (--by N | --to KEY | --all)
+                        [--outdir DIR] [FILE ...]
+
+Imports:
+    argparse, array, functools, itertools, os, re, sys: handle the
+        command line, hold the integer form and read the songs in chunks.
+    numpy: builds the histograms of the charts' keys.
+    base: contains the chromatic scale and the spelling functions.
+    chartstream: reads the charts from files or stdin.
+    chordparser: parses the chord names.
+    keyscore: finds the key of each chart.
+
+Vars:
+    MAJOR_TONICS, MINOR_TONICS (tuple): spelling of the tonic of the major
+        and minor key on each pitch class, the one with the fewest
+        accidents in its signature.
+
+Classes:
+    Chart: Chord chart read into its integer form.
+
+Functions:
+    parse_key(): returns the pitch class and mode of a key name.
+    key_name(): returns the name of a key from its pitch class and mode.
+    spelling(): returns the names of the 12 pitch classes in a key.
+    key_spelling(): the same, for the key on a pitch class.
+    find_keys(): sets the key of charts, all scored at once.
+    read_charts(): reads several charts, finding their keys at once.
+    transpose(): transposes the text of a chart.
+    transpose_songs(): yields songs transposed by several shifts.
+    main(): transposes charts from the command line.
+"""
+import argparse
+import array
+import functools
+import itertools
+import os
+import re
+import sys
+
+import numpy as np
+
+import base
+import chartstream
+import chordparser
+import keyscore
+
+MAJOR_TONICS = ("C", "Db", "D", "Eb", "E", "F",
+                "F#", "G", "Ab", "A", "Bb", "B")
+MINOR_TONICS = ("C", "C#", "D", "Eb", "E", "F",
+                "F#", "G", "G#", "A", "Bb", "B")
+
+_steps = {"M": (0, 2, 4, 5, 7, 9, 11), "m": (0, 2, 3, 5, 7, 8, 10)}
+_tonics = {"M": MAJOR_TONICS, "m": MINOR_TONICS}
+# Splits a chart into its tokens, keeping the spaces between them.
+_spaces = re.compile(r"(\s+)")
+_letters = "CDEFGAB"
+# Pitch classes set in each of the 4096 masks, as a (4096, 12) table.
+_bits = (np.arange(4096)[:, None] >> np.arange(12)) & 1
+
+
+def parse_key(key):
+    """Returns the pitch class and the mode ("M" or "m") of a key name.
+
+    Args:
+        key (str): tonic followed by "m" for a minor key. i.e: "F#m", "Bb"
+
+    Raises:
+        ValueError: if the tonic isn't a note.
+    """
+    if key.endswith("m"):
+        return base.pitch_class(key[:-1]), "m"
+    if key.endswith("M"):
+        key = key[:-1]
+    return base.pitch_class(key), "M"
+
+
+def key_name(pitch, mode="M"):
+    """Returns the name of the key on a pitch class. i.e: (8, "m") is "G#m".
+    """
+    name = _tonics[mode][pitch % 12]
+    return name + "m" if mode == "m" else name
+
+
+@functools.cache
+def spelling(tonic, mode="M"):
+    """Returns the names of the 12 pitch classes in a key.
+
+    The 7 notes of the key's scale (natural minor for minor keys) take one
+    letter per degree. The other 5 are spelled with sharps in keys whose
+    signature has sharps, with flats in those with flats, and as in
+    'base.notes' in C major and A minor.
+
+    Args:
+        tonic (str): tonic of the key, in any spelling of 'base.note_index'.
+        mode (str): "M" for a major key, "m" for a minor one.
+
+    Returns:
+        tuple: the names, by pitch class.
+    """
+    root = base.pitch_class(tonic)
+    scale = base.spell_scale(tonic, _steps[mode])
+    if any("#" in note for note in scale):
+        names = list(base.sharps)
+    elif any("b" in note for note in scale):
+        names = list(base.flats)
+    else:
+        names = list(base.notes)
+    for step, note in zip(_steps[mode], scale):
+        names[(root + step) % 12] = note
+    return tuple(names)
+
+
+def key_spelling(pitch, mode="M"):
+    """Returns the names of the 12 pitch classes in the key on a pitch class,
+    its tonic spelled as in 'MAJOR_TONICS' or 'MINOR_TONICS'.
+    """
+    return spelling(_tonics[mode][pitch % 12], mode)
+
+
+class Chart:
+    """Chord chart read into its integer form, to be written in any key.
+
+    The suffixes of the chords are interned in a table shared by all
+    charts, along with the mask of their intervals, as a corpus only has a
+    few hundred of them. The text that isn't a chord is kept by each chart.
+
+    Attributes:
+        roots (array): Pitch class of each chord's root, by token, or -1
+            for the tokens that aren't chords.
+        suffixes (array): Id of each chord's suffix in the shared table,
+            or the index of the token in 'texts' if it isn't a chord.
+        basses (array): Letters (above bit 4) and semitones from each
+            chord's root to its bass, or -1 if it has none, so the bass is
+            spelled as the same degree of the transposed root.
+        texts (list): Tokens that aren't chords, such as spaces and bar
+            lines.
+        tonic (int): Pitch class of the chart's tonic.
+        mode (str): "M" if the chart is in a major key, "m" if minor.
+
+    Methods:
+        masks: Returns the pitch-class mask of each chord.
+        key: Returns the name of the chart's key, or of a transposition.
+        render: Writes the chart a number of semitones higher.
+        render_all: Writes the chart in each of the 12 keys.
+    """
+
+    __slots__ = ("roots", "suffixes", "basses", "texts", "tonic", "mode")
+
+    _suffixes = []
+    _suffix_ids = {}
+    _suffix_masks = []
+
+    def __init__(self, text, key=None):
+        """Reads a chart into its integer form.
+
+        Args:
+            text (str): the chart. Tokens that are not valid chord names
+                are kept as they are.
+            key (str): key of the chart, as 'parse_key' reads it. If None,
+                the most probable one, see 'find_keys'.
+        """
+        self._read(text)
+        if key is None:
+            find_keys([self])
+        else:
+            self.tonic, self.mode = parse_key(key)
+
+    def _read(self, text):
+        """Reads the tokens of a chart, leaving its key unset."""
+        self.roots = array.array("b")
+        self.suffixes = array.array("H")
+        self.basses = array.array("b")
+        self.texts = []
+        for token in _spaces.split(text):
+            symbol = None
+            if token and not token.isspace():
+                try:
+                    symbol = chordparser.parse(token)
+                except ValueError:
+                    pass
+            if symbol is None:
+                self._add_text(token)
+                continue
+
+            root = base.pitch_class(symbol.root)
+            end = len(token) - len(symbol.bass) - 1 if symbol.bass else None
+            suffix = token[len(symbol.root):end]
+            ids = self._suffix_ids
+            if suffix not in ids:
+                ids[suffix] = len(self._suffixes)
+                self._suffixes.append(suffix)
+                mask = 1
+                for semitones in chordparser.intervals(symbol):
+                    mask |= 1 << semitones % 12
+                self._suffix_masks.append(mask)
+            self.roots.append(root)
+            self.suffixes.append(ids[suffix])
+            if symbol.bass:
+                letters = (_letters.index(symbol.bass[0])
+                           - _letters.index(symbol.root[0])) % 7
+                semitones = (base.pitch_class(symbol.bass) - root) % 12
+                self.basses.append(letters << 4 | semitones)
+            else:
+                self.basses.append(-1)
+
+    def _add_text(self, token):
+        """Keeps a token that isn't a chord."""
+        self.roots.append(-1)
+        self.suffixes.append(len(self.texts))
+        self.basses.append(-1)
+        self.texts.append(token)
+
+    def masks(self):
+        """Returns the pitch-class mask of each chord, bass included."""
+        output = []
+        suffix_masks = self._suffix_masks
+        for root, suffix, bass in zip(self.roots, self.suffixes,
+                                      self.basses):
+            if root >= 0:
+                mask = base.rotate(suffix_masks[suffix], root)
+                if bass >= 0:
+                    mask |= 1 << (root + (bass & 15)) % 12
+                output.append(mask)
+        return output
+
+    def key(self, shift=0):
+        """Returns the name of the chart's key, 'shift' semitones higher."""
+        return key_name(self.tonic + shift, self.mode)
+
+    def render(self, shift=0, tonic=None):
+        """Writes the chart a number of semitones higher.
+
+        Args:
+            shift (int): semitones added to every note, wrapping around.
+            tonic (str): spelling of the target key's tonic, if it isn't
+                that of 'MAJOR_TONICS' or 'MINOR_TONICS'. i.e: "Gb"
+
+        Returns:
+            str: the chart, spelled in the target key.
+        """
+        names = spelling(tonic or _tonics[self.mode][(self.tonic + shift)
+                                                     % 12], self.mode)
+        suffixes = self._suffixes
+        texts = self.texts
+        spell_degree = base.spell_degree
+        pieces = []
+        for root, suffix, bass in zip(self.roots, self.suffixes,
+                                      self.basses):
+            if root < 0:
+                pieces.append(texts[suffix])
+                continue
+            name = names[(root + shift) % 12]
+            pieces.append(name)
+            pieces.append(suffixes[suffix])
+            if bass >= 0:
+                pieces.append("/")
+                pieces.append(spell_degree(name, bass >> 4, bass & 15))
+        return "".join(pieces)
+
+    def render_all(self):
+        """Writes the chart in each of the 12 keys, from its own up.
+
+        Returns:
+            dict: pairs the name of each key with the chart in it.
+        """
+        return {self.key(shift): self.render(shift) for shift in range(12)}
+
+
+def find_keys(charts):
+    """Sets the key of charts to the most probable one, all scored at once.
+
+    Each chart's pitch-class histogram is built from its chord masks, as
+    'keyscore.histogram' builds it from chord names, and the histograms
+    are ranked together by 'keyscore.rank_weighted_many'. Charts without
+    chords are set to C major.
+    """
+    if not charts:
+        return
+    histograms = np.zeros((len(charts), 12))
+    for row, chart in zip(histograms, charts):
+        masks = chart.masks()
+        if masks:
+            row += _bits[masks].sum(axis=0)
+    for chart, keys in zip(charts, keyscore.rank_weighted_many(histograms,
+                                                               1)):
+        tonic, chart.mode, _ = keys[0]
+        chart.tonic = base.pitch_class(tonic)
+
+
+def read_charts(texts, key=None):
+    """Reads several charts, finding their keys all at once.
+
+    Args:
+        texts (iterable): the charts.
+        key (str): key of every chart, found from each one's chords if None.
+
+    Returns:
+        list: the Chart of each text.
+    """
+    charts = []
+    for text in texts:
+        chart = Chart.__new__(Chart)
+        chart._read(text)
+        if key is not None:
+            chart.tonic, chart.mode = parse_key(key)
+        charts.append(chart)
+    if key is None:
+        find_keys(charts)
+    return charts
+
+
+def transpose(text, by=0, to=None, key=None):
+    """Transposes the text of a chart.
+
+    Args:
+        text (str): the chart.
+        by (int): semitones to transpose by, if 'to' is None.
+        to (str): target key. Its mode is ignored, the chart keeps its own.
+            i.e: "Gb" writes a chart in Eb major in Gb major
+        key (str): key of the chart, found from its chords if None.
+    """
+    chart = Chart(text, key)
+    if to is None:
+        return chart.render(by)
+    pitch, _ = parse_key(to)
+    return chart.render(pitch - chart.tonic, to.rstrip("Mm"))
+
+
+def transpose_songs(songs, shifts=range(12), key=None, chunk=256):
+    """Yields songs transposed by several shifts, reading each song once.
+
+    The songs are read 'chunk' at a time, so their keys are found together
+    while memory stays flat.
+
+    Args:
+        songs (iterable): pairs of a song's number and its text, as
+            'chartstream.read_songs' yields them.
+        shifts (iterable): semitones to transpose each song by.
+        key (str): key of every song, found from each one's chords if None.
+
+    Yields:
+        tuple: the song's number, the name of the key it was transposed to
+            and its text in that key, for each shift.
+    """
+    shifts = tuple(shifts)
+    songs = iter(songs)
+    while True:
+        batch = list(itertools.islice(songs, chunk))
+        if not batch:
+            return
+        charts = read_charts((text for _, text in batch), key)
+        for (number, _), chart in zip(batch, charts):
+            for shift in shifts:
+                yield number, chart.key(shift), chart.render(shift)
+
+
+def main(argv=None):
+    """Transposes charts from the files in the command line, or stdin.
+
+    With '--all' and '--outdir', the songs in each key go to a file of
+    their own, named after the key's offset from the song's (such as
+    "+3.txt"), all written in the same pass.
+    """
+    parser = argparse.ArgumentParser(
+        description="Transpose chord charts to other keys.")
+    parser.add_argument("files", nargs="*",
+                        help="chart files, stdin if none or '-'")
+    parser.add_argument("--blocks", action="store_true",
+                        help="songs are separated by blank lines")
+    parser.add_argument("--key", help="key of every song, i.e: 'Bb' or "
+                                      "'F#m' (default: found per song)")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--by", type=int, help="semitones to transpose by")
+    target.add_argument("--to", help="key to transpose to, i.e: 'Eb'")
+    target.add_argument("--all", action="store_true",
+                        help="write each song in the 12 keys")
+    parser.add_argument("--outdir", help="with --all, write the songs "
+                                         "transposed by each shift to a "
+                                         "file of their own")
+    args = parser.parse_args(argv)
+
+    songs = chartstream.read_songs(chartstream.read_lines(args.files),
+                                   args.blocks, "\n")
+    end = "\n\n" if args.blocks else "\n"
+    if args.to is not None:
+        for _, text in songs:
+            sys.stdout.write(transpose(text, to=args.to, key=args.key) + end)
+    elif not args.all:
+        for _, _, text in transpose_songs(songs, (args.by,), args.key):
+            sys.stdout.write(text + end)
+    elif args.outdir:
+        os.makedirs(args.outdir, exist_ok=True)
+        files = [open(os.path.join(args.outdir, "{:+d}.txt".format(shift)),
+                      "w", encoding="utf-8") for shift in range(12)]
+        try:
+            # Each song comes in the 12 keys in turn, from its own up.
+            versions = transpose_songs(songs, key=args.key)
+            for index, (_, _, text) in enumerate(versions):
+                files[index % 12].write(text + end)
+        finally:
+            for file in files:
+                file.close()
+    else:
+        for number, key, text in transpose_songs(songs, key=args.key):
+            sys.stdout.write("[{}] {}\n{}{}".format(number, key, text, end))
+
+
+if __name__ == "__main__":
+    main()
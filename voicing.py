@@ -0,0 +1,330 @@
+"""Module to find concrete voicings of chords, the best first, lazily.
+
+A voicing places each note of a chord on a pitch, as a MIDI note number
+(60 is the middle C), within a range and a largest span, doubling only the
+notes that may be doubled and leaving out only those that may be left out.
+Voicings are built from the bass up, one note at a time, through a best-
+first search: the partial voicings wait in a heap ordered by their cost so
+far, and since every note only adds to the cost, a complete voicing popped
+from the heap costs no more than any other still to come. The voicings are
+so yielded in order of cost, and only the partial voicings cheaper than the
+last one yielded are ever expanded. A partial voicing is dropped as soon as
+it can't be completed: out of range or span, a note doubled once too often,
+too few voices left for the notes still missing, or no fingering left on
+the instrument, if one is given.
+
+The cost of a voicing adds up, with the weights of 'WEIGHTS':
+    - "span": each semitone from the lowest note to the highest.
+    - "low": each semitone missing from an interval too close for its
+      register, such as a third in the bass ("low" intervals below).
+    - "gap": each semitone over an octave between neighbouring voices.
+    - "double": each doubled note.
+    - "omit": each note left out.
+    - "register": each semitone of each note from the centre of the range.
+    - "leading": each semitone of each note from the nearest note of the
+      previous voicing, if any, so consecutive chords move smoothly.
+
+Imports:
+    collections, heapq, itertools: hold the voicings and the search heap.
+    base: contains the pitch-class functions.
+    baseclasses: contains the Chord class.
+    chordparser: returns the notes of chord names.
+    instrument: counts the partial voicings expanded.
+
+Vars:
+    WEIGHTS (dict): default weight of each part of the cost.
+    STANDARD_TUNING (tuple): MIDI notes of the open strings of a guitar.
+
+Classes:
+    Voicing: A voicing of a chord, with its cost.
+    Guitar: Instrument constraint of a fretted, stringed instrument.
+    Keyboard: Instrument constraint of two hands on a keyboard.
+
+Functions:
+    chord_tones(): returns the root, bass and spelling of a chord's notes.
+    voicings(): yields the voicings of a chord, the cheapest first.
+    top(): returns the cheapest voicings of a chord.
+"""
+import collections
+import heapq
+import itertools
+
+import base
+import baseclasses
+import chordparser
+import instrument
+
+WEIGHTS = {"span": 0.05, "low": 1.0, "gap": 0.5, "double": 1.0,
+           "omit": 1.5, "register": 0.05, "leading": 0.3}
+STANDARD_TUNING = (40, 45, 50, 55, 59, 64)
+
+# The smallest interval that sounds clear between two voices, by the MIDI
+# note below which the lower one is, lowest registers first. Seconds are
+# never clear.
+_low_intervals = ((48, 7), (55, 4), (60, 3), (128, 2))
+
+
+class Voicing(collections.namedtuple("Voicing", "pitches names cost")):
+    """A voicing of a chord, with its cost.
+
+    Attributes:
+        pitches: MIDI note numbers of the voices, the lowest first.
+        names: Names of the voices with their octave. i.e: ("C3", "Bb3")
+        cost: Cost of the voicing, lower is better.
+    """
+
+    __slots__ = ()
+
+
+class Guitar:
+    """Instrument constraint of a fretted, stringed instrument.
+
+    The voices are played from the lowest string up, one per string, and
+    strings may be skipped. A voicing fits if each voice has a fret on its
+    string and the fretted voices span at most 'stretch' frets.
+
+    Attributes:
+        tuning (tuple): MIDI notes of the open strings, the lowest first.
+        frets (int): Highest fret that can be played.
+        stretch (int): Largest distance between the fretted voices.
+
+    Methods:
+        fits: Checks if voices can be fingered.
+    """
+
+    def __init__(self, tuning=STANDARD_TUNING, frets=15, stretch=4):
+        """Sets up the instrument's strings and reach."""
+        self.tuning = tuple(tuning)
+        self.frets = frets
+        self.stretch = stretch
+        self.low = self.tuning[0]
+        self.high = max(self.tuning) + frets
+
+    def fits(self, pitches):
+        """Checks if voices, the lowest first, can be fingered.
+
+        Tries each string for each voice, from the lowest string up,
+        keeping the lowest and highest fret in use.
+        """
+        def place(voice, string, lowest, highest):
+            if voice == len(pitches):
+                return True
+            for index in range(string, len(self.tuning)):
+                fret = pitches[voice] - self.tuning[index]
+                if not 0 <= fret <= self.frets:
+                    continue
+                if fret:
+                    low, high = min(lowest, fret), max(highest, fret)
+                    if high - low > self.stretch:
+                        continue
+                else:
+                    low, high = lowest, highest
+                if place(voice + 1, index + 1, low, high):
+                    return True
+            return False
+
+        return place(0, 0, self.frets + 1, -1)
+
+
+class Keyboard:
+    """Instrument constraint of two hands on a keyboard.
+
+    A voicing fits if it splits into a left hand, the lowest voices, and a
+    right hand, each of at most 'fingers' voices spanning at most 'reach'
+    semitones. Either hand may play nothing.
+
+    Attributes:
+        reach (int): Largest span of one hand, in semitones.
+        fingers (int): Most voices played by one hand.
+
+    Methods:
+        fits: Checks if voices can be played by two hands.
+    """
+
+    low = 21
+    high = 108
+
+    def __init__(self, reach=12, fingers=5):
+        """Sets up the reach of each hand."""
+        self.reach = reach
+        self.fingers = fingers
+
+    def _hand(self, pitches):
+        """Checks if one hand plays voices."""
+        return (len(pitches) <= self.fingers
+                and (not pitches or pitches[-1] - pitches[0] <= self.reach))
+
+    def fits(self, pitches):
+        """Checks if voices, the lowest first, can be played by two hands.
+        """
+        return any(self._hand(pitches[:split]) and self._hand(pitches[split:])
+                   for split in range(len(pitches) + 1))
+
+
+def chord_tones(chord):
+    """Returns the root, bass and spelling of a chord's notes.
+
+    Args:
+        chord: a chord name, a Chord instance (decomposed if it wasn't
+            yet), or its notes, the root first.
+
+    Returns:
+        root (int): pitch class of the root.
+        bass (int): pitch class of the bass, the root if there is no other.
+        spelling (dict): pairs the pitch class of each note with its name.
+    """
+    bass = None
+    if isinstance(chord, str):
+        symbol = chordparser.parse(chord)
+        notes = chordparser.chord_notes(chord)
+        if symbol.bass:
+            bass = base.pitch_class(symbol.bass)
+    else:
+        if isinstance(chord, baseclasses.Chord):
+            if not chord.root:
+                chord.decompose()
+            chord = chord.notes
+        notes = list(chord)
+    if not notes:
+        raise ValueError("a chord needs at least one note")
+
+    spelling = {}
+    for note in notes:
+        spelling.setdefault(base.pitch_class(note), str(note))
+    root = base.pitch_class(notes[0])
+    return root, root if bass is None else bass, spelling
+
+
+def _name(pitch, spelling):
+    """Returns the name of a pitch with its octave, C4 being 60."""
+    return "{}{}".format(spelling[pitch % 12], pitch // 12 - 1)
+
+
+def voicings(chord, low=40, high=84, span=24, voices=None,
+             doubled=(0, 7), optional=(7,), bass=True, fingering=None,
+             previous=None, weights=None):
+    """Yields the voicings of a chord, the cheapest first.
+
+    Args:
+        chord: a chord name, a Chord instance or its notes, the root first.
+        low, high (int): MIDI notes of the range, the instrument's if it is
+            narrower.
+        span (int): largest distance from the lowest voice to the highest.
+        voices (tuple): least and most voices, or an int for both. By
+            default, from the notes that can't be left out to the notes of
+            the chord, at least 3 and 4.
+        doubled (tuple): intervals from the root that may be doubled, once
+            each. The others appear once at most.
+        optional (tuple): intervals from the root that may be left out.
+        bass (bool): if true, the lowest voice is the root, or the bass of
+            a slash chord.
+        fingering (Guitar or Keyboard): instrument the voicings must fit.
+        previous (tuple): MIDI notes of the voicing before, if any.
+        weights (dict): weights replacing some of 'WEIGHTS'.
+
+    Yields:
+        Voicing: the voicings, by increasing cost.
+
+    Raises:
+        ValueError: if the chord has no notes or can't be read.
+    """
+    root, lowest, spelling = chord_tones(chord)
+    weights = dict(WEIGHTS, **(weights or {}))
+    if fingering is not None:
+        low = max(low, fingering.low)
+        high = min(high, fingering.high)
+    intervals = {pitch_class: (pitch_class - root) % 12
+                 for pitch_class in spelling}
+    required = {pitch_class for pitch_class in spelling
+                if intervals[pitch_class] not in optional}
+    if bass:
+        required.add(lowest)
+    limits = {pitch_class: 2 if intervals[pitch_class] in doubled else 1
+              for pitch_class in spelling}
+    if voices is None:
+        voices = (max(len(required), min(3, len(spelling))),
+                  max(4, len(spelling)))
+    elif isinstance(voices, int):
+        voices = (voices, voices)
+    least, most = max(voices[0], 1), voices[1]
+    centre = (low + high) / 2
+
+    def step(last, pitch, count):
+        """Returns the cost added by a voice above the last one."""
+        cost = weights["register"] * abs(pitch - centre)
+        if count:
+            cost += weights["double"]
+        if previous:
+            cost += weights["leading"] * min(abs(pitch - note)
+                                             for note in previous)
+        if last is None:
+            return cost
+        distance = pitch - last
+        cost += weights["span"] * distance
+        for limit, smallest in _low_intervals:
+            if last < limit:
+                cost += weights["low"] * max(smallest - distance, 0)
+                break
+        return cost + weights["gap"] * max(distance - 12, 0)
+
+    def reachable(pitch_class, above, top):
+        """Checks if a pitch class has a note above one, up to 'top'."""
+        return above + (pitch_class - above - 1) % 12 + 1 <= top
+
+    # Entries are (cost, 0 if complete else 1, order, voices); the order
+    # breaks ties in the order the entries were made.
+    order = itertools.count()
+    heap = []
+    for pitch in range(low, high + 1):
+        pitch_class = pitch % 12
+        if pitch_class not in spelling or (bass and pitch_class != lowest):
+            continue
+        heapq.heappush(heap, (step(None, pitch, 0), 1, next(order),
+                              (pitch,)))
+
+    expanded = 0
+    while heap:
+        cost, partial, _, chosen = heapq.heappop(heap)
+        if not partial:
+            instrument.count("voicing.expanded", expanded)
+            expanded = 0
+            yield Voicing(chosen, tuple(_name(pitch, spelling)
+                                        for pitch in chosen), round(cost, 4))
+            continue
+
+        expanded += 1
+        counts = collections.Counter(pitch % 12 for pitch in chosen)
+        missing = required.difference(counts)
+        if not missing and len(chosen) >= least:
+            omitted = len(spelling) - len(counts)
+            heapq.heappush(heap, (cost + weights["omit"] * omitted, 0,
+                                  next(order), chosen))
+        if len(chosen) == most:
+            continue
+
+        last = chosen[-1]
+        top = min(high, chosen[0] + span)
+        for pitch in range(last + 1, top + 1):
+            pitch_class = pitch % 12
+            count = counts.get(pitch_class, 0)
+            if pitch_class not in spelling or count >= limits[pitch_class]:
+                continue
+            still = missing - {pitch_class}
+            if len(still) > most - len(chosen) - 1 or not all(
+                    reachable(other, pitch, top) for other in still):
+                continue
+            voiced = chosen + (pitch,)
+            if fingering is not None and not fingering.fits(voiced):
+                continue
+            heapq.heappush(heap, (cost + step(last, pitch, count), 1,
+                                  next(order), voiced))
+    instrument.count("voicing.expanded", expanded)
+
+
+def top(chord, count=20, **constraints):
+    """Returns the 'count' cheapest voicings of a chord.
+
+    Takes the constraints of 'voicings', and only searches as far as the
+    last voicing returned.
+    """
+    return list(itertools.islice(voicings(chord, **constraints), count))